@@ -10,16 +10,121 @@ from lagom.transform import ExpFactorCumSum
 from lagom.history.batch_segment import BatchSegment
 from lagom.history.metrics import final_state_from_segment
 from lagom.history.metrics import terminal_state_from_segment
-from lagom.history.metrics import bootstrapped_returns_from_segment
-from lagom.history.metrics import gae_from_segment
 
 
+import time
+
 import numpy as np
 
 import torch
 import torch.optim as optim
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.distributions import Categorical
+
+from dial_control_rl import returns
+
+
+class StridedSegment(BatchSegment):
+    """Every `step`-th timestep of a `BatchSegment`, from `start` on.
+
+    The arrays are strided views of `D`'s and the info lists hold `D`'s info
+    dicts, so nothing is copied, and writing to one segment writes to the
+    other.
+    """
+
+    def __init__(self, D, start=0, step=2):
+        # An empty segment of `D`'s envs, whose storage the views replace.
+        super().__init__(D.env_spec, 0)
+        self.T = len(range(start, D.T, step))
+        self._observations = D.numpy_observations[:, start::step]
+        self._actions = D.numpy_actions[:, start::step]
+        self._rewards = D.numpy_rewards[:, start::step]
+        self._dones = D.numpy_dones[:, start::step]
+        self.info = [info[start::step] for info in D.infos]
+        self.batch_info = D.batch_infos[start::step]
+
+    @property
+    def numpy_observations(self):
+        return self._observations
+
+    @property
+    def numpy_actions(self):
+        return self._actions
+
+    @property
+    def numpy_rewards(self):
+        return self._rewards
+
+    @property
+    def numpy_dones(self):
+        return self._dones
+
+    @property
+    def numpy_masks(self):
+        return np.logical_not(self._dones).astype(np.float32)
+
+    @property
+    def infos(self):
+        return self.info
+
+    @property
+    def batch_infos(self):
+        return self.batch_info
+
+    @property
+    def total_T(self):
+        return self.N * self.T
+
+
+class RolloutBuffer:
+    """Preallocated T x N tensors of a rollout, written one timestep at a time
+    by `Agent.choose_action`.
+
+    Everything is stored without autograd history; `Agent.learn` evaluates
+    the policy on all of `observations` in one batch instead. Rewards and
+    dones are only known to the runner, and are copied from its segment by
+    `add_segment`.
+    """
+
+    def __init__(self, T, N, obs_dim, device):
+        self.observations = torch.zeros(T, N, obs_dim, device=device)
+        self.actions = torch.zeros(T, N, dtype=torch.long, device=device)
+        self.logprobs = torch.zeros(T, N, device=device)
+        self.values = torch.zeros(T, N, device=device)
+        self.entropies = torch.zeros(T, N, device=device)
+        self.rewards = torch.zeros(T, N, device=device)
+        self.dones = torch.zeros(T, N, device=device)
+        self.t = 0
+
+    @property
+    def T(self):
+        return self.rewards.shape[0]
+
+    def add(self, obs, out):
+        if self.t == self.T:
+            self._grow()
+        t = self.t
+        self.observations[t] = obs
+        self.actions[t] = out['action']
+        self.logprobs[t] = out['action_logprob']
+        self.values[t] = out['V'].squeeze(-1)
+        self.entropies[t] = out['entropy']
+        self.t += 1
+
+    def add_segment(self, D):
+        assert D.T == self.t, 'The segment is not the buffered rollout.'
+        self.rewards[:D.T] = torch.from_numpy(D.numpy_rewards.T)
+        self.dones[:D.T] = torch.from_numpy(D.numpy_dones.T)
+
+    def reset(self):
+        self.t = 0
+
+    def _grow(self):
+        for name in ('observations', 'actions', 'logprobs', 'values',
+                     'entropies', 'rewards', 'dones'):
+            x = getattr(self, name)
+            setattr(self, name, torch.cat([x, torch.zeros_like(x)]))
 
 
 class Policy(BasePolicy):
@@ -76,6 +181,87 @@ class Policy(BasePolicy):
 
         return out
 
+    @torch.inference_mode()
+    def evaluate(self, x, out_keys=('V',)):
+        """Like `__call__`, but only computes `out_keys`, without autograd.
+
+        Besides `__call__`'s keys, 'logits' and 'probs' give the action
+        scores and probabilities, and an action is only sampled if 'action'
+        or 'action_logprob' is requested. No `Categorical` is built unless
+        'action_dist' is requested.
+        """
+        out = {}
+        features = self.featurize(x)
+        if 'V' in out_keys:
+            out['V'] = self.V_head(features)
+        policy_keys = {'action', 'action_logprob', 'entropy', 'perplexity',
+                       'action_dist', 'logits', 'probs'}
+        if policy_keys.isdisjoint(out_keys):
+            return out
+
+        logits = self.action_head.action_head(features)
+        if 'logits' in out_keys:
+            out['logits'] = logits
+        if 'action_dist' in out_keys:
+            out['action_dist'] = Categorical(logits=logits)
+        if (policy_keys - {'logits', 'action_dist'}).isdisjoint(out_keys):
+            return out
+        probs = F.softmax(logits, dim=-1)
+        if 'probs' in out_keys:
+            out['probs'] = probs
+        if 'action' in out_keys or 'action_logprob' in out_keys:
+            # Samples as `Categorical.sample` does.
+            action = torch.multinomial(probs.reshape(-1, probs.shape[-1]), 1,
+                                       True).reshape(probs.shape[:-1])
+            out['action'] = action
+        if {'action_logprob', 'entropy', 'perplexity'}.isdisjoint(out_keys):
+            return out
+        logprobs = F.log_softmax(logits, dim=-1)
+        if 'action_logprob' in out_keys:
+            out['action_logprob'] = logprobs.gather(
+                -1, action.unsqueeze(-1)).squeeze(-1)
+        entropy = -(probs*logprobs).sum(-1)
+        if 'entropy' in out_keys:
+            out['entropy'] = entropy
+        if 'perplexity' in out_keys:
+            out['perplexity'] = entropy.exp()
+        return out
+
+
+def time_num_threads(policy, T, N, candidates, repeats=3):
+    """Seconds per training iteration with each number of torch threads in
+    `candidates`, timed on random observations of `policy`'s size.
+
+    An iteration is T batched forward passes over N observations, as in
+    `Agent.choose_action`, and one forward and backward pass over T // 2 x N
+    of them, as in `Agent.learn`. Gradients are zeroed afterwards.
+    """
+    # Leave the global RNG, which samples actions, as it was.
+    with torch.random.fork_rng(devices=[]):
+        input_dim = policy.env_spec.observation_space.flat_dim
+        acting_obs = torch.randn(N, input_dim, device=policy.device)
+        learning_obs = torch.randn(T // 2 * N, input_dim, device=policy.device)
+        num_threads = torch.get_num_threads()
+        times = {}
+        for candidate in candidates:
+            torch.set_num_threads(candidate)
+            for repeat in range(repeats + 1):
+                # The first repeat warms up the thread pool.
+                if repeat == 1:
+                    start = time.perf_counter()
+                for _ in range(T):
+                    policy.evaluate(acting_obs, out_keys=['action',
+                                                          'action_logprob',
+                                                          'V', 'entropy'])
+                features = policy.featurize(learning_obs)
+                loss = (policy.action_head(features).entropy().mean() +
+                        policy.V_head(features).mean())
+                loss.backward()
+            times[candidate] = (time.perf_counter() - start) / repeats
+    policy.optimizer.zero_grad()
+    torch.set_num_threads(num_threads)
+    return times
+
 
 class Agent(BaseAgent):
 
@@ -84,6 +270,14 @@ class Agent(BaseAgent):
 
     def prepare(self, config, **kwargs):
         self.total_T = 0
+        # Allocated by the first `choose_action`, once N is known.
+        self.rollout = None
+        # A number of torch threads, or 'auto' to time 1, 2, 4... up to the
+        # current number when N is known and use the fastest.
+        self.num_threads = config['agent.num_threads']
+        self.thread_times = {}
+        if self.num_threads != 'auto':
+            torch.set_num_threads(self.num_threads)
 
     def reset(self, config, **kwargs):
         pass
@@ -96,47 +290,80 @@ class Agent(BaseAgent):
         obs = torch.from_numpy(np.asarray(obs)).float().to(self.device)
 
         if self.training:
-            out = self.policy(obs, out_keys=['action', 'action_logprob', 'V',
-                                             'entropy'], info=info)
+            out = self.policy.evaluate(obs, out_keys=['action', 'action_logprob',
+                                                      'V', 'entropy'])
+            if self.num_threads == 'auto':
+                self.choose_num_threads(obs.shape[0])
+            if self.rollout is None:
+                self.rollout = RolloutBuffer(int(self.env_spec.T),
+                                             obs.shape[0], obs.shape[1],
+                                             self.device)
+            self.rollout.add(obs, out)
         else:
-            with torch.no_grad():
-                out = self.policy(obs, out_keys=['action'], info=info)
+            out = self.policy.evaluate(obs, out_keys=['action'])
 
         if torch.any(torch.isnan(out['action'])):
             raise ValueError('NaN!')
 
         return out
 
-    def learn(self, D, info={}):
-        # Only take our half of the transitions from D.
-        D2 = BatchSegment(D.env_spec, D.T // 2)
-        for t in range(0, D.T, 2):
-            t_out = t // 2
-            D2.add_observation(t_out, D.numpy_observations[:, t])
-            D2.add_action(t_out, D.numpy_actions[:, t])
-            D2.add_reward(t_out, D.numpy_rewards[:, t])
-            D2.add_done(t_out, D.numpy_dones[:, t])
-            D2.add_info([info[t] for info in D.infos])
-            D2.add_batch_info(D.batch_info[t])
-        D = D2
-        # The rest of this is just a2c.
+    def choose_num_threads(self, N):
+        max_threads = torch.get_num_threads()
+        candidates = [1]
+        while candidates[-1] * 2 <= max_threads:
+            candidates.append(candidates[-1] * 2)
+        if candidates[-1] != max_threads:
+            candidates.append(max_threads)
+        self.thread_times = time_num_threads(self.policy, int(self.env_spec.T),
+                                             N, candidates)
+        self.num_threads = min(self.thread_times, key=self.thread_times.get)
+        torch.set_num_threads(self.num_threads)
+        print(f'Using {self.num_threads} torch threads: ' +
+              ', '.join(f'{n}: {t * 1e3:.1f} ms' for n, t in
+                        self.thread_times.items()) + ' per iteration.')
 
-        logprobs = torch.stack([info['action_logprob'] for info in D.batch_infos], 1).squeeze(-1)
-        entropies = torch.stack([info['entropy'] for info in D.batch_infos], 1).squeeze(-1)
-        all_Vs = torch.stack([info['V'] for info in D.batch_infos], 1).squeeze(-1)
-        
+    def returns_and_advantages(self, D, T):
+        """The (N, T // 2) returns and advantages of our half, `D`, of the
+        buffered rollout of length `T`."""
+        rollout = self.rollout
         last_states = torch.from_numpy(final_state_from_segment(D)).float().to(self.device)
-        with torch.no_grad():
-            last_Vs = self.policy(last_states, out_keys=['V'])['V']
-        Qs = bootstrapped_returns_from_segment(D, last_Vs, self.config['algo.gamma'])
-        Qs = torch.from_numpy(Qs.copy()).float().to(self.device)
+        last_Vs = self.policy.evaluate(last_states, out_keys=['V'])['V'].squeeze(-1)
+        if self.config['agent.jit_returns']:
+            returns_fn = returns.scripted_bootstrapped_returns
+            gae_fn = returns.scripted_gae
+        else:
+            returns_fn, gae_fn = returns.bootstrapped_returns, returns.gae
+        rewards = rollout.rewards[:T:2]
+        # An episode which ended on player 2's turn ends before our next
+        # one, too.
+        dones = rollout.dones[:T:2].clone()
+        their_dones = rollout.dones[1:T:2]
+        dones[:len(their_dones)] = torch.max(dones[:len(their_dones)],
+                                             their_dones)
+        Qs = returns_fn(rewards, dones, last_Vs, self.config['algo.gamma']).t()
         if self.config['agent.standardize_Q']:
             Qs = (Qs - Qs.mean(1, keepdim=True))/(Qs.std(1, keepdim=True) + 1e-8)
         
-        As = gae_from_segment(D, all_Vs, last_Vs, self.config['algo.gamma'], self.config['algo.gae_lambda'])
-        As = torch.from_numpy(As.copy()).float().to(self.device)
+        As = gae_fn(rewards, dones, rollout.values[:T:2], last_Vs,
+                    self.config['algo.gamma'], self.config['algo.gae_lambda']).t()
         if self.config['agent.standardize_adv']:
             As = (As - As.mean(1, keepdim=True))/(As.std(1, keepdim=True) + 1e-8)
+        return Qs, As
+
+    def learn(self, D, info={}):
+        rollout = self.rollout
+        rollout.add_segment(D)
+        # Only take our half of the transitions from D.
+        T = D.T
+        D = StridedSegment(D, 0, 2)
+        # The rest of this is just a2c.
+
+        features = self.policy.featurize(rollout.observations[:T:2])
+        action_dist = self.policy.action_head(features)
+        logprobs = action_dist.log_prob(rollout.actions[:T:2]).t()
+        entropies = action_dist.entropy().t()
+        all_Vs = self.policy.V_head(features).squeeze(-1).t()
+        Qs, As = self.returns_and_advantages(D, T)
         
         assert all([x.ndimension() == 2 for x in [logprobs, entropies, all_Vs, Qs, As]])
         
@@ -151,18 +378,14 @@ class Agent(BaseAgent):
         value_coef = self.config['agent.value_coef']
         loss = policy_loss + value_coef*value_loss + entropy_coef*entropy_loss
         
-        if self.config['agent.fit_terminal_value']:
-            terminal_states = terminal_state_from_segment(D)
-            if terminal_states is not None:
-                terminal_states = torch.from_numpy(terminal_states).float().to(self.device)
-                terminal_Vs = self.policy(terminal_states, out_keys=['V'])['V']
-                terminal_value_loss = F.mse_loss(terminal_Vs, torch.zeros_like(terminal_Vs))
-                terminal_value_loss_coef = self.config['agent.terminal_value_coef']
-                loss += terminal_value_loss_coef*terminal_value_loss
+        terminal_states = self.terminal_states(D)
+        if terminal_states is not None:
+            loss += self.terminal_value_loss(terminal_states)
         
         self.policy.optimizer.zero_grad()
         loss.backward()
         self.policy.optimizer_step(self.config, total_T=self.total_T)
+        rollout.reset()
         
         self.total_T += D.total_T
         
@@ -177,3 +400,100 @@ class Agent(BaseAgent):
         out['explained_variance'] = ev
         
         return out
+
+
+    def terminal_states(self, D):
+        """The terminal states of `D` to fit the value of, if
+        `agent.fit_terminal_value` is on and there are any."""
+        if not self.config['agent.fit_terminal_value']:
+            return None
+        terminal_states = terminal_state_from_segment(D)
+        if terminal_states is None:
+            return None
+        return torch.from_numpy(terminal_states).float().to(self.device)
+
+    def terminal_value_loss(self, terminal_states):
+        """The weighted loss of fitting zero values to `terminal_states`."""
+        terminal_Vs = self.policy(terminal_states, out_keys=['V'])['V']
+        terminal_value_loss = F.mse_loss(terminal_Vs, torch.zeros_like(terminal_Vs))
+        return self.config['agent.terminal_value_coef']*terminal_value_loss
+
+
+class PPOAgent(Agent):
+    """Runs `agent.ppo_epochs` epochs of the clipped surrogate objective over
+    shuffled minibatches of each rollout instead of a single A2C step.
+
+    Returns and advantages are computed once per rollout, from the values
+    the rollout was collected with. With `agent.fit_terminal_value`, every
+    minibatch step also fits the values of the rollout's terminal states.
+    """
+
+    def learn(self, D, info={}):
+        rollout = self.rollout
+        rollout.add_segment(D)
+        # Only take our half of the transitions from D.
+        T = D.T
+        D = StridedSegment(D, 0, 2)
+        Qs, As = self.returns_and_advantages(D, T)
+        terminal_states = self.terminal_states(D)
+
+        # Flatten (T // 2, N) timesteps into one batch.
+        observations = rollout.observations[:T:2].flatten(0, 1)
+        actions = rollout.actions[:T:2].flatten(0, 1)
+        old_logprobs = rollout.logprobs[:T:2].flatten(0, 1)
+        Qs = Qs.t().flatten()
+        As = As.t().flatten()
+        batch_size = len(actions)
+        minibatch_size = max(batch_size // self.config['agent.num_minibatches'], 1)
+        clip_range = self.config['agent.clip_range']
+        entropy_coef = self.config['agent.entropy_coef']
+        value_coef = self.config['agent.value_coef']
+
+        stats = {'loss': [], 'policy_loss': [], 'entropy_loss': [],
+                 'value_loss': [], 'clip_fraction': [], 'approx_kl': []}
+        for epoch in range(self.config['agent.ppo_epochs']):
+            permutation = torch.randperm(batch_size, device=self.device)
+            for start in range(0, batch_size, minibatch_size):
+                idx = permutation[start:start + minibatch_size]
+                features = self.policy.featurize(observations[idx])
+                action_dist = self.policy.action_head(features)
+                logprobs = action_dist.log_prob(actions[idx])
+                Vs = self.policy.V_head(features).squeeze(-1)
+
+                ratio = torch.exp(logprobs - old_logprobs[idx])
+                policy_loss = -torch.min(
+                    ratio*As[idx],
+                    torch.clamp(ratio, 1 - clip_range, 1 + clip_range)*As[idx]).mean()
+                entropy_loss = -action_dist.entropy().mean()
+                value_loss = F.mse_loss(Vs, Qs[idx])
+                loss = policy_loss + value_coef*value_loss + entropy_coef*entropy_loss
+                if terminal_states is not None:
+                    loss = loss + self.terminal_value_loss(terminal_states)
+
+                self.policy.optimizer.zero_grad()
+                loss.backward()
+                nn.utils.clip_grad_norm_(self.policy.parameters(),
+                                         self.config['agent.max_grad_norm'])
+                self.policy.optimizer_step(self.config, total_T=self.total_T)
+
+                with torch.no_grad():
+                    stats['loss'].append(loss.item())
+                    stats['policy_loss'].append(policy_loss.item())
+                    stats['entropy_loss'].append(entropy_loss.item())
+                    stats['value_loss'].append(value_loss.item())
+                    stats['clip_fraction'].append(
+                        ((ratio - 1).abs() > clip_range).float().mean().item())
+                    stats['approx_kl'].append(
+                        (old_logprobs[idx] - logprobs).mean().item())
+        rollout.reset()
+
+        self.total_T += D.total_T
+
+        out = {key: float(np.mean(values)) for key, values in stats.items()}
+        out['policy_entropy'] = -out['entropy_loss']
+        Vs = self.policy.evaluate(observations, out_keys=['V'])['V'].squeeze(-1)
+        ev = ExplainedVariance()
+        ev = ev(y_true=Qs.cpu().numpy(), y_pred=Vs.cpu().numpy())
+        out['explained_variance'] = ev
+
+        return out
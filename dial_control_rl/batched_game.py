@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""Pure NumPy simulator running many crafting games in lock-step.
+
+`BatchedGame` keeps the state of N games as struct-of-arrays tensors and
+reproduces the semantics of `game.make_game` + `Engine.play` exactly, without
+constructing any pycolab sprites. Run this module to check it against the
+pycolab engine and to compare their throughput.
+"""
+
+import sys
+sys.path.append('.')
+
+import time
+
+import numpy as np
+
+from dial_control_rl import event_log, game
+from dial_control_rl.event_log import EventType
+
+EMPTY = ord(' ')
+
+PLAYER_CODES = np.array([ord(game.PLAYER_1), ord(game.PLAYER_2)],
+                        dtype=np.uint8)
+
+# [row, col] deltas for UP, DOWN, LEFT, RIGHT.
+MOVES = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+
+
+def _find(char, background):
+    for row, line in enumerate(background):
+        if char in line:
+            return np.array([row, line.index(char)])
+
+
+def _lookup(chars, values, default):
+    table = np.full(256, default, dtype=np.int64)
+    for c, v in zip(chars, values):
+        table[ord(c)] = v
+    return table
+
+
+def item_chars(layout=game.DEFAULT_LAYOUT):
+    """Things that can be interacted with, in z-order (back to front)."""
+    return [c for c in layout.z_order if c in layout.items]
+
+
+def initial_state(seed, layout=game.DEFAULT_LAYOUT):
+    """Draws a starting state the same way `game.make_game(seed, layout)`
+    does."""
+    random_state = np.random.RandomState(seed)
+    art = game.gen_start(random_state, layout)
+    chars = item_chars(layout)
+    item_pos = np.zeros((len(chars), 2), dtype=np.int64)
+    player_pos = np.zeros((2, 2), dtype=np.int64)
+    for row, line in enumerate(art):
+        for col, c in enumerate(line):
+            if c in chars:
+                item_pos[chars.index(c)] = (row, col)
+            elif c in (game.PLAYER_1, game.PLAYER_2):
+                player_pos[int(c) - 1] = (row, col)
+    goals = np.zeros((2, layout.goal_len))
+    for player in (1, 2):
+        goals[player - 1,
+              random_state.randint(0, layout.jewelry_len - 1)] = 1.0
+    return item_pos, player_pos, goals
+
+
+class BatchedGame:
+    """N crafting games stepped together with batched array operations.
+
+    Actions are the same integers passed to `Engine.play` (player 2's actions
+    offset by `layout.p2_off`). Inventory and queue entries hold character
+    codes, with `EMPTY` marking an empty inventory slot. A step on which
+    pycolab would report a reward of `None` reports 0.
+    """
+
+    def __init__(self, seeds, layout=game.DEFAULT_LAYOUT):
+        self.seeds = list(seeds)
+        self.layout = layout
+        self.item_codes = np.array([ord(c) for c in item_chars(layout)],
+                                   dtype=np.uint8)
+        self.num_drop_slots = len(layout.dropped_items)
+        self.crucible_pos = _find(game.CRUCIBLE, layout.background)
+        self.bench_pos = _find(game.BENCH, layout.background)
+        # What lies beneath all sprites, including the inventory row.
+        self.backdrop = np.array(
+            [[ord(c) for c in line.replace(game.CRUCIBLE, ' ')
+                                  .replace(game.BENCH, ' ')]
+             for line in layout.background], dtype=np.uint8)
+        self.metal_of = _lookup(layout.metals, range(len(layout.metals)), -1)
+        self.gem_of = _lookup(layout.gems, range(len(layout.gems)), -1)
+
+        n = self.num_games = len(self.seeds)
+        self.player_pos = np.zeros((n, 2, 2), dtype=np.int64)
+        self.item_pos = np.zeros((n, len(self.item_codes), 2), dtype=np.int64)
+        self.inv = np.zeros((n, 2, layout.inv_size), dtype=np.uint8)
+        self.drop_pos = np.zeros((n, self.num_drop_slots, 2), dtype=np.int64)
+        self.drop_visible = np.zeros((n, self.num_drop_slots), dtype=bool)
+        self.drop_item = np.zeros((n, self.num_drop_slots), dtype=np.uint8)
+        self.drop_index = np.zeros(n, dtype=np.int64)
+        self.crucible = np.zeros((n, 3), dtype=np.uint8)
+        self.crucible_len = np.zeros(n, dtype=np.int64)
+        self.bench = np.zeros((n, 2), dtype=np.uint8)
+        self.bench_len = np.zeros(n, dtype=np.int64)
+        self.goals = np.zeros((n, 2, layout.goal_len))
+        self.goal_complete = np.zeros((n, 2), dtype=bool)
+        self.completed = np.zeros((n, layout.goal_len), dtype=bool)
+        self.game_over = np.zeros(n, dtype=bool)
+        # `the_plot.frame` of each game, which logged events carry.
+        self.frame = np.zeros(n, dtype=np.int64)
+        self._board = np.zeros((n,) + self.backdrop.shape, dtype=np.uint8)
+        self.observation_buffer = np.zeros(
+            (n, layout.observation_buffer_len), dtype=np.uint8)
+        self._observation_views = game.split_observation(
+            self.observation_buffer, layout)
+
+        self._start_item_pos = np.zeros_like(self.item_pos)
+        self._start_player_pos = np.zeros_like(self.player_pos)
+        self._start_goals = np.zeros_like(self.goals)
+        for i, seed in enumerate(self.seeds):
+            (self._start_item_pos[i], self._start_player_pos[i],
+             self._start_goals[i]) = initial_state(seed, layout)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Restores the starting state of the games selected by `mask`."""
+        if mask is None:
+            mask = np.ones(self.num_games, dtype=bool)
+        self.item_pos[mask] = self._start_item_pos[mask]
+        self.player_pos[mask] = self._start_player_pos[mask]
+        self.goals[mask] = self._start_goals[mask]
+        self.inv[mask] = EMPTY
+        self.drop_pos[mask] = 0
+        self.drop_visible[mask] = False
+        self.drop_item[mask] = 0
+        self.drop_index[mask] = 0
+        self.crucible[mask] = 0
+        self.crucible_len[mask] = 0
+        self.bench[mask] = 0
+        self.bench_len[mask] = 0
+        self.goal_complete[mask] = False
+        self.completed[mask] = False
+        self.game_over[mask] = False
+        self.frame[mask] = 0
+
+    def step(self, actions):
+        """Applies one `Engine.play(action)` per game.
+
+        Returns the summed rewards and the game-over flags.
+        """
+        layout = self.layout
+        actions = np.asarray(actions, dtype=np.int64)
+        rows = np.arange(self.num_games)
+        player = (actions >= layout.p2_off).astype(np.int64)
+        action = actions % layout.p2_off
+        reward = np.zeros(self.num_games)
+        self.frame += 1
+
+        quit = actions == layout.quit
+        reward -= ~self.goal_complete[rows, player] & ~quit
+        reward -= action != game.Action.SKIP
+
+        moving = np.nonzero((game.Action.UP <= action) &
+                            (action <= game.Action.RIGHT))[0]
+        new_pos = (self.player_pos[moving, player[moving]] +
+                   MOVES[action[moving] - game.Action.UP])
+        in_bounds = ((0 <= new_pos[:, 0]) &
+                     (new_pos[:, 0] < layout.map_height) &
+                     (0 <= new_pos[:, 1]) &
+                     (new_pos[:, 1] < layout.map_width))
+        self.player_pos[moving[in_bounds], player[moving[in_bounds]]] = \
+            new_pos[in_bounds]
+
+        using = np.nonzero((game.Action.ITEM1 <= action) &
+                           (action < game.Action.ITEM1 + layout.inv_size))[0]
+        self._update_item(using, player[using],
+                          action[using] - game.Action.ITEM1, reward)
+
+        self.game_over |= quit
+        return reward, self.game_over.copy()
+
+    def _update_item(self, idx, player, slot, reward):
+        # Mirrors the loop in `Player.update_item`: things at the player's
+        # position are visited in z-order, and `found` carries across them.
+        pos = self.player_pos[idx, player]
+        found = np.zeros(len(idx), dtype=bool)
+
+        for place_pos, make in ((self.crucible_pos,
+                                 self._make_crucible_jewelry),
+                                (self.bench_pos, self._make_bench_jewelry)):
+            item = self.inv[idx, player, slot]
+            put = np.all(pos == place_pos, axis=1) & (item != EMPTY)
+            found |= put
+            self._log_events(EventType.PUT, idx[put], player[put], item[put],
+                             slot[put], pos[put])
+            make(idx[put], player[put], item[put], reward)
+
+        for k, code in enumerate(self.item_codes):
+            here = np.all(self.item_pos[idx, k] == pos, axis=1)
+            self.inv[idx[here], player[here], slot[here]] = code
+            found |= here
+            self._log_events(EventType.PICKUP, idx[here], player[here], code,
+                             slot[here], pos[here])
+
+        for k in range(self.num_drop_slots):
+            here = (self.drop_visible[idx, k] &
+                    np.all(self.drop_pos[idx, k] == pos, axis=1))
+            item = self.inv[idx, player, slot]
+            pick = here & ~found
+            self.inv[idx[pick], player[pick], slot[pick]] = \
+                self.drop_item[idx[pick], k]
+            self.drop_visible[idx[pick], k] = False
+            self._log_events(EventType.PICKUP, idx[pick], player[pick],
+                             self.drop_item[idx[pick], k], slot[pick],
+                             pos[pick])
+            self._drop(idx, player, slot, pos, item, pick & (item != EMPTY),
+                       found)
+
+        for other in (0, 1):
+            here = np.all(self.player_pos[idx, other] == pos, axis=1)
+            item = self.inv[idx, player, slot]
+            self._drop(idx, player, slot, pos, item,
+                       here & ~found & (item != EMPTY), found)
+
+    def _drop(self, idx, player, slot, pos, item, mask, found):
+        found |= mask
+        games = idx[mask]
+        self._log_events(EventType.DROP, games, player[mask], item[mask],
+                         slot[mask], pos[mask])
+        drop_index = self.drop_index[games]
+        self.drop_index[games] = (drop_index + 1) % self.num_drop_slots
+        self.drop_pos[games, drop_index] = pos[mask]
+        self.drop_visible[games, drop_index] = True
+        self.drop_item[games, drop_index] = item[mask]
+
+    def _make_crucible_jewelry(self, idx, player, item, reward):
+        length = self.crucible_len[idx]
+        self.crucible[idx, length] = item
+        length += 1
+        full = length == 3
+        crown = full & np.any(self.crucible[idx] == ord(game.COAL), axis=1)
+        self._make_from(idx[crown], player[crown], self.crucible[idx[crown]],
+                        game.JewelryShape.CROWN, reward)
+        self.crucible[idx[full], :2] = self.crucible[idx[full], 1:]
+        length[full] = 2
+        ring = length == 2
+        ring[full] = False
+        self._make_from(idx[ring], player[ring], self.crucible[idx[ring], :2],
+                        game.JewelryShape.RING, reward)
+        self.crucible_len[idx] = length
+
+    def _make_bench_jewelry(self, idx, player, item, reward):
+        length = self.bench_len[idx]
+        full = length == 2
+        self.bench[idx[full], 0] = self.bench[idx[full], 1]
+        length[full] = 1
+        self.bench[idx, length] = item
+        length += 1
+        self.bench_len[idx] = length
+        made = length == 2
+        self._make_from(idx[made], player[made], self.bench[idx[made]],
+                        game.JewelryShape.BRACELET, reward)
+
+    def _make_from(self, idx, player, items, shape, reward):
+        metals = self.metal_of[items]
+        gems = self.gem_of[items]
+        ok = (np.sum(metals >= 0, axis=1) == 1) & (np.sum(gems >= 0, axis=1) == 1)
+        jewelry = self.layout.jewelry_index(shape, metals.max(axis=1),
+                                            gems.max(axis=1))
+        self._give_reward(idx[ok], player[ok], jewelry[ok], reward)
+
+    def _give_reward(self, idx, player, jewelry_idx, reward):
+        self.completed[idx, jewelry_idx] = True
+        self._log_events(EventType.CRAFT, idx, player, jewelry=jewelry_idx)
+        for p in (0, 1):
+            player_reward = self.goals[idx, p, jewelry_idx] * game.GOAL_REWARD
+            reward[idx] += player_reward
+            rewarded = player_reward > 0
+            self.goal_complete[idx[rewarded], p] = True
+            self._log_events(EventType.REWARD, idx[rewarded], p,
+                             jewelry=jewelry_idx[rewarded],
+                             reward=player_reward[rewarded])
+
+    def _log_events(self, type, idx, player, item=0, slot=0, pos=-1,
+                    jewelry=-1, reward=0.0):
+        """Appends one event per game in `idx` to the active
+        `event_log.EventLog`, if any. `player` is 0-based."""
+        events = event_log.ACTIVE
+        if events is None or len(idx) == 0:
+            return
+        records = np.zeros(len(idx), dtype=event_log.EVENT_DTYPE)
+        records['env'] = idx
+        records['frame'] = self.frame[idx]
+        records['type'] = type
+        records['player'] = np.add(player, 1)
+        records['item'] = item
+        records['slot'] = slot
+        pos = np.broadcast_to(pos, (len(idx), 2))
+        records['row'] = pos[:, 0]
+        records['col'] = pos[:, 1]
+        records['jewelry'] = jewelry
+        records['reward'] = reward
+        events.extend(records)
+
+    def render_board(self):
+        """Paints the boards `Engine._render` would produce, inventory row
+        included, as an (N, rows, cols) uint8 array."""
+        board = self._board
+        rows = np.arange(self.num_games)
+        board[:] = self.backdrop
+        board[:, self.crucible_pos[0], self.crucible_pos[1]] = \
+            ord(game.CRUCIBLE)
+        board[:, self.bench_pos[0], self.bench_pos[1]] = ord(game.BENCH)
+        for k, code in enumerate(self.item_codes):
+            board[rows, self.item_pos[:, k, 0], self.item_pos[:, k, 1]] = code
+        for k in range(self.num_drop_slots):
+            vis = rows[self.drop_visible[:, k]]
+            board[vis, self.drop_pos[vis, k, 0], self.drop_pos[vis, k, 1]] = \
+                self.drop_item[vis, k]
+        for p, code in enumerate(PLAYER_CODES):
+            board[rows, self.player_pos[:, p, 0], self.player_pos[:, p, 1]] = \
+                code
+        board[:, self.layout.map_height, :2 * self.layout.inv_size] = \
+            self.inv.reshape(self.num_games, -1)
+        return board
+
+    def render_human(self, i):
+        return '\n'.join(''.join(chr(c) for c in line)
+                         for line in self.render_board()[i])
+
+    def render_observation(self):
+        """Batched `Engine.render_observation`, writing into
+        `observation_buffer`, an (N, `layout.observation_buffer_len`) array
+        laid out like `Engine.observation_buffer`."""
+        board = self.render_board()[:, :self.layout.map_height]
+        (grid, inv1, inv2, player1_grid, player2_grid, completed,
+         goal1, goal2) = self._observation_views
+        np.take(self.layout.grid_codes, board, out=grid)
+        np.equal(board, PLAYER_CODES[0], out=player1_grid)
+        np.equal(board, PLAYER_CODES[1], out=player2_grid)
+        inv1[:] = self.inv[:, 0]
+        inv2[:] = self.inv[:, 1]
+        completed[:] = self.completed
+        goal1[:] = self.goals[:, 0]
+        goal2[:] = self.goals[:, 1]
+        return self._observation_views[:6]
+
+
+def differential_check(seeds, steps=500, action_seed=0,
+                       layout=game.DEFAULT_LAYOUT):
+    """Steps `BatchedGame` and one pycolab engine per seed with the same random
+    actions and asserts that their boards, observations, rewards and
+    game-over flags agree."""
+    random_state = np.random.RandomState(action_seed)
+    batch = BatchedGame(seeds, layout)
+    engines = [game.make_game(seed, layout) for seed in seeds]
+    for engine in engines:
+        engine.its_showtime()
+    for t in range(steps):
+        actions = random_state.randint(0, 2 * layout.p2_off, size=len(seeds))
+        # Quit rarely, so that games last long enough to craft something.
+        actions[random_state.rand(len(seeds)) < 0.01] = layout.quit
+        rewards, game_over = batch.step(actions)
+        observations = batch.render_observation()
+        for i, engine in enumerate(engines):
+            _, reward, _ = engine.play(int(actions[i]))
+            expected = engine.render_observation()
+            assert engine.render_human() == batch.render_human(i), (t, i)
+            for part, expected_part in zip(observations, expected):
+                assert np.array_equal(part[i], expected_part), (t, i)
+            assert (0 if reward is None else reward) == rewards[i], (t, i)
+            assert engine.game_over == game_over[i], (t, i)
+            if engine.game_over:
+                engines[i] = game.make_game(seeds[i], layout)
+                engines[i].its_showtime()
+        batch.reset(game_over)
+
+
+def benchmark(num_games=1024, steps=200):
+    random_state = np.random.RandomState(0)
+    seeds = list(range(num_games))
+    actions = random_state.randint(0, 2 * game.P2_OFF,
+                                   size=(steps, num_games))
+
+    batch = BatchedGame(seeds)
+    start = time.perf_counter()
+    for t in range(steps):
+        batch.step(actions[t])
+        batch.render_observation()
+    batched_rate = steps * num_games / (time.perf_counter() - start)
+
+    engines = [game.make_game(seed) for seed in seeds[:16]]
+    for engine in engines:
+        engine.its_showtime()
+    start = time.perf_counter()
+    for t in range(steps):
+        for i, engine in enumerate(engines):
+            engine.play(int(actions[t, i]))
+            engine.render_observation()
+    pycolab_rate = steps * len(engines) / (time.perf_counter() - start)
+
+    print(f'pycolab: {pycolab_rate:.0f} steps/sec')
+    print(f'batched (N={num_games}): {batched_rate:.0f} steps/sec '
+          f'({batched_rate / pycolab_rate:.1f}x)')
+
+
+if __name__ == '__main__':
+    differential_check(list(range(32)))
+    differential_check(list(range(8)), steps=200,
+                       layout=game.Layout(12, 8, num_gems=7, num_metals=3,
+                                          num_drop_slots=8, inv_size=4))
+    print('BatchedGame matches pycolab.')
+    benchmark()
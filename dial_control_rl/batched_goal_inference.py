@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Goal inference for many dialogues at once.
+
+`BatchGoalInference` keeps the confidences of B dialogues as B x GOAL_LEN
+arrays and applies `GoalInference.forward_act`, `net_confidence` and `state`
+to all of them with array operations. Acts are given as arrays: one
+`ForwardChannelAct` (or `NO_ACT`) per dialogue, and B x K abbreviation
+indices and confidences, padded with -1 and 0. `encode` builds them from
+lists. Run this module to check it against `GoalInference` and to compare
+their speed.
+"""
+
+import sys
+sys.path.append('.')
+
+import time
+
+import numpy as np
+
+from dial_control_rl import game
+from dial_control_rl.goal_inference import (ABBREVS, DISTS, BackChannelAct,
+                                            ForwardChannelAct, GoalInference,
+                                            InferenceState, forward_channel)
+
+# Dialogues without an act this turn.
+NO_ACT = -1
+# Goals of back channel acts without one.
+NO_GOAL = -1
+
+ABBREV_INDEX = dict([(abbrev, i) for i, (abbrev, _) in enumerate(ABBREVS)])
+DIST_MATRIX = np.stack([DISTS[abbrev] for abbrev, _ in ABBREVS])
+
+
+def encode(abbrevs, confidences=None):
+    """Padded (B, K) abbreviation indices and confidences of B lists of
+    abbreviations and of their confidences, one by default."""
+    K = max([len(a) for a in abbrevs] + [1])
+    indices = np.full((len(abbrevs), K), -1, dtype=np.int64)
+    confs = np.zeros((len(abbrevs), K))
+    for i, a in enumerate(abbrevs):
+        indices[i, :len(a)] = [ABBREV_INDEX[x] for x in a]
+        confs[i, :len(a)] = 1.0 if confidences is None else confidences[i]
+    return indices, confs
+
+
+def encode_dialogue_acts(dialogue_acts, previous_acts=None):
+    """The acts, abbreviation indices and confidences of a list of
+    `DialogueAct`s, or None for dialogues without one, answering
+    `previous_acts`, as in `forward_channel`."""
+    if previous_acts is None:
+        previous_acts = [None] * len(dialogue_acts)
+    acts = np.full(len(dialogue_acts), NO_ACT, dtype=np.int64)
+    abbrevs = []
+    for i, (dialogue_act, previous) in enumerate(zip(dialogue_acts,
+                                                     previous_acts)):
+        forward = (None if dialogue_act is None
+                   else forward_channel(dialogue_act, previous))
+        if forward is None:
+            abbrevs.append([])
+        else:
+            acts[i] = forward[0]
+            abbrevs.append(forward[1])
+    return (acts,) + encode(abbrevs)
+
+
+class BatchGoalInference:
+
+    def __init__(self, num_dialogues, certainty_threshold=0.75,
+                 update_threshold=0.1):
+        self.num_dialogues = num_dialogues
+        self.certainty_threshold = certainty_threshold
+        self.update_threshold = update_threshold
+        self.conf_per_goal = np.zeros((num_dialogues, game.GOAL_LEN))
+        self.conf_not_goal = np.zeros((num_dialogues, game.GOAL_LEN))
+        self.confirmed = np.zeros(num_dialogues, dtype=bool)
+
+    def full_reset(self, mask=None):
+        """Resets the dialogues in the boolean `mask`, or all of them."""
+        if mask is None:
+            mask = slice(None)
+        self.conf_per_goal[mask] = 0.0
+        self.conf_not_goal[mask] = 0.0
+        self.confirmed[mask] = False
+
+    @property
+    def net_confidence(self):
+        return np.clip(self.conf_per_goal - self.conf_not_goal, 0, 1)
+
+    @property
+    def state(self):
+        """The (B,) `InferenceState`s and most likely goals."""
+        net_confidence = self.net_confidence
+        rows = np.arange(self.num_dialogues)
+        most_likely_goal = np.argmax(net_confidence, axis=1)
+        conf_most_likely = net_confidence[rows, most_likely_goal]
+        net_confidence[rows, most_likely_goal] = 0.0
+        relative_conf = conf_most_likely - net_confidence.max(axis=1)
+        certain = relative_conf > self.certainty_threshold
+        confused = (np.min(self.conf_not_goal, axis=1) >
+                    1 - self.certainty_threshold)
+        state = np.select(
+            [certain & self.confirmed, certain, confused],
+            [InferenceState.CONFIRMED, InferenceState.UNCONFIRMED,
+             InferenceState.CONFUSED], InferenceState.UNCERTAIN)
+        return state, most_likely_goal
+
+    def forward_act(self, acts, abbrevs, confidences):
+        """Applies each dialogue's `ForwardChannelAct` in `acts`, about the
+        abbreviations with indices `abbrevs`, to it, and returns the (B,)
+        `BackChannelAct`s and goals, `NO_GOAL` where there is none.
+        Dialogues whose act is `NO_ACT` make no progress."""
+        acts = np.asarray(acts)
+        abbrevs = np.asarray(abbrevs)
+        confidences = np.asarray(confidences, dtype=np.float64)
+        assert np.all(confidences[abbrevs >= 0] > 0)
+        back_acts = np.full(self.num_dialogues, BackChannelAct.NO_PROGRESS)
+        goals = np.full(self.num_dialogues, NO_GOAL)
+
+        part = acts == ForwardChannelAct.PART_OF_GOAL
+        not_part = acts == ForwardChannelAct.NOT_PART_OF_GOAL
+        original_conf_per_goal = self.conf_per_goal[part]
+        original_conf_not_goal = self.conf_not_goal[not_part]
+        # Abbreviations are applied one after the other, as in
+        # `GoalInference.forward_act`.
+        for k in range(abbrevs.shape[1]):
+            valid = abbrevs[:, k] >= 0
+            conf = confidences[:, k, None]
+            dist = DIST_MATRIX[abbrevs[:, k]]
+            rows = part & valid
+            if rows.any():
+                conf_not_goal = np.clip(self.conf_not_goal[rows] + conf[rows] -
+                                        dist[rows], 0, 1)
+                self.conf_not_goal[rows] = conf_not_goal
+                self.conf_per_goal[rows] = np.clip(
+                    self.conf_per_goal[rows] + conf[rows] * dist[rows] +
+                    (1 - conf_not_goal), 0, 1)
+            rows = not_part & valid
+            if rows.any():
+                self.conf_not_goal[rows] = np.clip(
+                    self.conf_not_goal[rows] + conf[rows] * dist[rows], 0, 1)
+
+        progress = np.zeros(self.num_dialogues, dtype=bool)
+        progress[part] = np.any(self.conf_per_goal[part] -
+                                original_conf_per_goal >
+                                self.update_threshold, axis=1)
+        progress[not_part] = np.any(self.conf_not_goal[not_part] -
+                                    original_conf_not_goal >
+                                    self.update_threshold, axis=1)
+
+        state, most_likely_goal = self.state
+        confirm = acts == ForwardChannelAct.CONFIRM
+        done = confirm & (state == InferenceState.UNCONFIRMED)
+        self.confirmed[done] = True
+        back_acts[confirm] = BackChannelAct.INCONSISTENT_ACT
+        back_acts[done] = BackChannelAct.DONE
+        goals[done] = most_likely_goal[done]
+
+        request = progress & (state == InferenceState.UNCONFIRMED)
+        back_acts[progress] = BackChannelAct.PROGRESS
+        back_acts[request] = BackChannelAct.REQUEST_CONFIRMATION
+        goals[request] = most_likely_goal[request]
+        reset = ((progress & (state == InferenceState.CONFUSED)) |
+                 (acts == ForwardChannelAct.DISCONFIRM))
+        back_acts[reset] = BackChannelAct.RESET
+        self.full_reset(reset)
+        return back_acts, goals
+
+
+def _random_turn(random_state, B):
+    acts = random_state.choice(
+        [NO_ACT] + list(ForwardChannelAct), size=B,
+        p=[0.1, 0.5, 0.25, 0.1, 0.05])
+    abbrevs = [list(random_state.choice([a for a, _ in ABBREVS],
+                                        size=random_state.randint(4)))
+               for _ in range(B)]
+    confidences = [list(random_state.uniform(0.05, 1.0, size=len(a)))
+                   for a in abbrevs]
+    return acts, abbrevs, confidences
+
+
+def differential_check(B=64, turns=300, seed=0):
+    """Runs `BatchGoalInference` and one `GoalInference` per dialogue on the
+    same random acts and asserts that their outputs and confidences
+    agree."""
+    random_state = np.random.RandomState(seed)
+    batch = BatchGoalInference(B)
+    inferences = [GoalInference() for _ in range(B)]
+    for t in range(turns):
+        acts, abbrevs, confidences = _random_turn(random_state, B)
+        back_acts, goals = batch.forward_act(acts,
+                                             *encode(abbrevs, confidences))
+        for i, inference in enumerate(inferences):
+            if acts[i] == NO_ACT:
+                expected = BackChannelAct.NO_PROGRESS, None
+            else:
+                expected = inference.forward_act(ForwardChannelAct(acts[i]),
+                                                 abbrevs[i], confidences[i])
+            goal = None if goals[i] == NO_GOAL else goals[i]
+            assert (back_acts[i], goal) == expected, (t, i)
+            assert np.allclose(batch.conf_per_goal[i],
+                               inference.conf_per_goal), (t, i)
+            assert np.allclose(batch.conf_not_goal[i],
+                               inference.conf_not_goal), (t, i)
+            state, goal = inference.state
+            assert batch.state[0][i] == state, (t, i)
+            assert batch.state[1][i] == goal, (t, i)
+
+
+def benchmark(B=4096, turns=20, seed=0):
+    random_state = np.random.RandomState(seed)
+    inputs = [_random_turn(random_state, B) for _ in range(turns)]
+
+    batch = BatchGoalInference(B)
+    encoded = [(acts,) + encode(abbrevs, confidences)
+               for acts, abbrevs, confidences in inputs]
+    start = time.perf_counter()
+    for acts, abbrevs, confidences in encoded:
+        batch.forward_act(acts, abbrevs, confidences)
+        batch.state
+    batched_rate = B * turns / (time.perf_counter() - start)
+
+    inferences = [GoalInference() for _ in range(B)]
+    start = time.perf_counter()
+    for acts, abbrevs, confidences in inputs:
+        for i, inference in enumerate(inferences):
+            if acts[i] != NO_ACT:
+                inference.forward_act(ForwardChannelAct(acts[i]), abbrevs[i],
+                                      confidences[i])
+            inference.state
+    serial_rate = B * turns / (time.perf_counter() - start)
+
+    print(f'GoalInference: {serial_rate:.0f} acts/sec')
+    print(f'BatchGoalInference (B={B}): {batched_rate:.0f} acts/sec '
+          f'({batched_rate / serial_rate:.1f}x)')
+
+
+if __name__ == '__main__':
+    differential_check()
+    print('BatchGoalInference matches GoalInference.')
+    benchmark()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Steps/sec and memory per env of the pycolab engine and `BatchedGame` as
+the map, item counts and inventory grow.
+
+Memory is the peak traced by `tracemalloc` while constructing and resetting
+the envs, divided by their number.
+"""
+
+import sys
+sys.path.append('.')
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from dial_control_rl import game
+from dial_control_rl.batched_game import BatchedGame
+
+LAYOUTS = [
+    ('default 6x4', {}),
+    ('12x8', dict(map_width=12, map_height=8)),
+    ('24x16', dict(map_width=24, map_height=16)),
+    ('48x32', dict(map_width=48, map_height=32)),
+    ('96x64', dict(map_width=96, map_height=64)),
+    ('12x8, 10 gems, 4 metals', dict(map_width=12, map_height=8, num_gems=10,
+                                     num_metals=4)),
+    ('24x16, 20 gems, 8 metals', dict(map_width=24, map_height=16,
+                                      num_gems=20, num_metals=8)),
+    ('12x8, 24 drop slots', dict(map_width=12, map_height=8,
+                                 num_drop_slots=24)),
+    ('12x8, inventory 6', dict(map_width=12, map_height=8, inv_size=6)),
+]
+
+
+def random_actions(layout, steps, num_envs, seed=0):
+    random_state = np.random.RandomState(seed)
+    return random_state.randint(0, 2 * layout.p2_off, size=(steps, num_envs))
+
+
+def memory_per_env(make, num_envs):
+    tracemalloc.start()
+    envs = make(num_envs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return envs, peak / num_envs
+
+
+def benchmark_pycolab(layout, num_envs=8, steps=200):
+    def make(n):
+        engines = [game.make_game(seed, layout) for seed in range(n)]
+        for engine in engines:
+            engine.its_showtime()
+        return engines
+
+    engines, memory = memory_per_env(make, num_envs)
+    actions = random_actions(layout, steps, num_envs)
+    start = time.perf_counter()
+    for t in range(steps):
+        for engine, action in zip(engines, actions[t]):
+            engine.play(int(action))
+            engine.render_observation()
+    rate = steps * num_envs / (time.perf_counter() - start)
+    return rate, memory
+
+
+def benchmark_batched(layout, num_envs=1024, steps=100):
+    batch, memory = memory_per_env(
+        lambda n: BatchedGame(range(n), layout), num_envs)
+    actions = random_actions(layout, steps, num_envs)
+    start = time.perf_counter()
+    for t in range(steps):
+        batch.step(actions[t])
+        batch.render_observation()
+    rate = steps * num_envs / (time.perf_counter() - start)
+    return rate, memory
+
+
+def main():
+    print(f'{"layout":<28}{"obs dim":>9}{"actions":>9}'
+          f'{"pycolab steps/s":>17}{"KiB/env":>9}'
+          f'{"batched steps/s":>17}{"KiB/env":>9}')
+    for name, kwargs in LAYOUTS:
+        layout = game.Layout(**kwargs)
+        pycolab_rate, pycolab_memory = benchmark_pycolab(layout)
+        batched_rate, batched_memory = benchmark_batched(layout)
+        print(f'{name:<28}{layout.player_observation_len:>9}'
+              f'{layout.num_actions:>9}'
+              f'{pycolab_rate:>17.0f}{pycolab_memory / 1024:>9.1f}'
+              f'{batched_rate:>17.0f}{batched_memory / 1024:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
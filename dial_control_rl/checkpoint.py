@@ -0,0 +1,73 @@
+"""Training checkpoints.
+
+A checkpoint holds everything needed to evaluate a policy on the
+observations it was trained on and to resume training where it stopped: the
+policy and optimizer states, `VecStandardize`'s running statistics, the
+iteration and timestep counters and the global random states. Checkpoints are
+written to a temporary file which then replaces the old one, so a crash never
+leaves a partial checkpoint behind.
+"""
+
+import os
+import random
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+
+FILENAME = 'checkpoint.pt'
+
+
+def save(path, agent, env, iteration):
+    """Checkpoints `agent` and the `VecStandardize` `env` after training
+    iteration `iteration`."""
+    path = Path(path)
+    obs_avg = env.obs_runningavg
+    state = {
+        'iteration': iteration,
+        'total_T': agent.total_T,
+        'policy': agent.policy.state_dict(),
+        'optimizer': agent.policy.optimizer.state_dict(),
+        'obs_runningavg': obs_avg,
+        'reward_runningavg': env.reward_runningavg,
+        'all_returns': env.all_returns,
+        # Plain copies for evaluating without the running average classes.
+        'obs_mean': np.array(obs_avg.mu, dtype=np.float32),
+        'obs_std': np.array(obs_avg.sigma, dtype=np.float32),
+        'clip_obs': env.clip_obs,
+        'eps': env.eps,
+        'rng': {'python': random.getstate(),
+                'numpy': np.random.get_state(),
+                'torch': torch.get_rng_state()},
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name,
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load(path, device='cpu'):
+    return torch.load(path, map_location=device, weights_only=False)
+
+
+def restore(checkpoint, agent, env):
+    """Loads `checkpoint` into `agent` and `env` and the global random
+    states, and returns the iteration to resume from."""
+    agent.policy.load_state_dict(checkpoint['policy'])
+    agent.policy.optimizer.load_state_dict(checkpoint['optimizer'])
+    agent.total_T = checkpoint['total_T']
+    env.obs_runningavg = checkpoint['obs_runningavg']
+    env.reward_runningavg = checkpoint['reward_runningavg']
+    env.all_returns = checkpoint['all_returns']
+    random.setstate(checkpoint['rng']['python'])
+    np.random.set_state(checkpoint['rng']['numpy'])
+    torch.set_rng_state(checkpoint['rng']['torch'])
+    return checkpoint['iteration'] + 1
@@ -0,0 +1,113 @@
+"""Dialogue acts passed between NLU, NLG and goal inference.
+
+A `DialogueAct` is an intent plus the slots it takes. Acts are only turned
+into command strings like "give_goal(gold,ruby,crown)", the format `nlu` and
+`nlg` used to exchange, at the edges, by `str` and `DialogueAct.parse`.
+"""
+
+import itertools
+from enum import IntEnum, unique
+from typing import NamedTuple, Optional
+
+
+@unique
+class Intent(IntEnum):
+    # Understood by `nlu`.
+    SKIP = 0
+    GO = 1
+    USE = 2
+    REQUEST = 3
+    OFFER = 4
+    ACCEPT_OFFER = 5
+    DECLINE_OFFER = 6
+    REQUEST_GOAL = 7
+    GIVE_GOAL = 8
+    CONFIRM_GOAL = 9
+    GOAL_CONFIRMED = 10
+    INVALID_INPUT = 11
+    # Only generated by `nlg`.
+    ACCEPT_ACTION = 12
+    DECLINE_ACTION = 13
+    REQUEST_ITEM = 14
+    OFFER_ITEM = 15
+    ACCEPT_REQUEST = 16
+    DECLINE_REQUEST = 17
+
+    @property
+    def command(self):
+        return self.name.lower()
+
+
+# The slots each intent takes, in the order of its command's parameters.
+SLOTS = {intent: () for intent in Intent}
+SLOTS.update({
+    Intent.GO: ('direction',),
+    Intent.USE: ('item',),
+    Intent.REQUEST: ('item',),
+    Intent.OFFER: ('item',),
+    Intent.REQUEST_ITEM: ('item',),
+    Intent.OFFER_ITEM: ('item',),
+    Intent.GIVE_GOAL: ('metal', 'gem', 'shape'),
+    Intent.CONFIRM_GOAL: ('metal', 'gem', 'shape'),
+})
+
+# The words each slot can take.
+DIRECTIONS = ('up', 'down', 'left', 'right')
+METALS = ('gold', 'silver')
+GEMS = ('ruby', 'amethyst', 'diamond', 'jade', 'coal', 'pearl')
+SHAPES = ('crown', 'bracelet', 'ring')
+ITEMS = ('ruby', 'gold', 'amethyst', 'diamond', 'silver', 'jade', 'coal',
+         'pearl')
+VALUES = {'direction': DIRECTIONS, 'item': ITEMS, 'metal': METALS,
+          'gem': GEMS, 'shape': SHAPES}
+
+_INTENTS = {intent.command: intent for intent in Intent}
+
+
+class DialogueAct(NamedTuple):
+    """An intent and its slots; slots it does not take are None.
+
+    Items, directions, metals, gems and shapes are lower case words, e.g.
+    'ruby', 'up', 'gold' and 'crown'.
+    """
+    intent: Intent
+    direction: Optional[str] = None
+    item: Optional[str] = None
+    metal: Optional[str] = None
+    gem: Optional[str] = None
+    shape: Optional[str] = None
+
+    @property
+    def params(self):
+        return tuple(getattr(self, slot) for slot in SLOTS[self.intent])
+
+    def __str__(self):
+        return '{0}({1})'.format(self.intent.command, ','.join(self.params))
+
+    @classmethod
+    def all(cls, intent):
+        """Every act of `intent`, one per combination of slot values."""
+        slots = SLOTS[intent]
+        return [cls(intent, **dict(zip(slots, values)))
+                for values in itertools.product(*(VALUES[slot]
+                                                  for slot in slots))]
+
+    @classmethod
+    def parse(cls, command):
+        """The act of a command string such as "request_item(gold)".
+
+        Raises a `ValueError` if the command is malformed or unknown, or has
+        the wrong number of parameters.
+        """
+        try:
+            name, params = command.rstrip(')').split('(')
+        except ValueError:
+            raise ValueError(f'Malformed command {command!r}.') from None
+        intent = _INTENTS.get(name)
+        if intent is None:
+            raise ValueError(f'Unknown command {name!r} in {command!r}.')
+        params = params.split(',') if params else []
+        if len(params) != len(SLOTS[intent]):
+            raise ValueError(f'{name} takes {len(SLOTS[intent])} parameters, '
+                             f'not {len(params)}, in {command!r}.')
+        return cls(intent, **dict(zip(SLOTS[intent], params)))
@@ -27,6 +27,9 @@ class Engine(BaseEngine):
         logger('num_segments', D.N)
         logger('num_timesteps', D.total_T)
         logger('accumulated_trained_timesteps', self.agent.total_T)
+        logger('num_threads', self.agent.num_threads)
+        if self.agent.thread_times:
+            logger('thread_times', self.agent.thread_times)
         print('-'*50)
         logger.dump(keys=None, index=None, indent=0)
         print('-'*50)
@@ -1,28 +1,54 @@
 from lagom.envs import Env
 from lagom.envs.spaces import Box, Discrete, Tuple
 from dial_control_rl import game
+from dial_control_rl.batched_game import BatchedGame
 import numpy as np
 
 
+def observation_spaces(layout):
+    """The structured and flattened observation spaces of games laid out by
+    `layout`."""
+    grid_shape = (layout.map_height, layout.map_width)
+    space = Tuple((
+        Box(0, 255, dtype=np.uint8, shape=grid_shape),
+        Box(0, 255, dtype=np.uint8, shape=(layout.inv_size,)),
+        Box(0, 255, dtype=np.uint8, shape=(layout.inv_size,)),
+        Box(0, 1, dtype=np.uint8, shape=grid_shape),
+        Box(0, 1, dtype=np.uint8, shape=grid_shape),
+        Box(0, 1, dtype=np.uint8, shape=(layout.goal_len,)),
+        Box(0, 1, dtype=np.uint8, shape=(layout.goal_len,))))
+    return space, Box(0, 255, dtype=np.uint8, shape=(space.flat_dim,))
+
+
+OBSERVATION_SPACE, FLAT_OBSERVATION_SPACE = \
+    observation_spaces(game.DEFAULT_LAYOUT)
+
+
 class CraftingEnv(Env):
 
-    def __init__(self, init_seed=None):
+    def __init__(self, init_seed=None, layout=game.DEFAULT_LAYOUT, env_id=0):
+        self.layout = layout
+        self.env_id = env_id
+        if layout is game.DEFAULT_LAYOUT:
+            self.actual_observation_space = OBSERVATION_SPACE
+            self._observation_space = FLAT_OBSERVATION_SPACE
+        else:
+            (self.actual_observation_space,
+             self._observation_space) = observation_spaces(layout)
         self.seed(init_seed)
 
     def _step_player(self):
-        self.current_player = ((self.current_player + 1) % 2) + 1
+        self.current_player = self.current_player % 2 + 1
 
     def step(self, action):
         player = self.current_player
-        action = game.action_for_player(player, action)
+        action = game.action_for_player(action, player, self.layout)
         _, reward, discount = self.game.play(action)
-        obs = self.game.render_observation()
+        self.game.render_observation()
 
         self._step_player()
 
-        obs = game.observations_for_player(obs, self.current_player)
-        obs = self.game.observation_with_goal(obs, self.current_player)
-        obs = self.actual_observation_space.flatten(obs)
+        obs = self._observation()
         return (obs, reward, self.game.game_over, {
                 'goals': self.game.goals(),
                 'player': player,
@@ -32,21 +58,9 @@ class CraftingEnv(Env):
         self.last_seed = seed
         self.current_player = 1
         self.random_state = np.random.RandomState(seed)
-        self.game = game.make_game(seed)
+        self.game = game.make_game(seed, self.layout, self.env_id)
         self.game.its_showtime()
-        self.actual_observation_space = Tuple((
-            Box(0, 255, dtype=np.uint8,
-                shape=(game.MAP_HEIGHT, game.MAP_WIDTH)),
-            Box(0, 255, dtype=np.uint8,
-                shape=(3,)),
-            Box(0, 255, dtype=np.uint8,
-                shape=(3,)),
-            Box(0, 1, dtype=np.uint8,
-                shape=(game.MAP_HEIGHT, game.MAP_WIDTH)),
-            Box(0, 1, dtype=np.uint8,
-                shape=(game.MAP_HEIGHT, game.MAP_WIDTH)),
-            Box(0, 1, dtype=np.uint8, shape=(game.GOAL_LEN,)),
-            Box(0, 1, dtype=np.uint8, shape=(game.GOAL_LEN,))))
+        self.initial_state = self.game.snapshot()
 
     def render(self, mode='human'):
         if mode == 'human':
@@ -59,12 +73,11 @@ class CraftingEnv(Env):
 
     @property
     def observation_space(self):
-        flat_dim = self.actual_observation_space.flat_dim
-        return Box(0, 255, dtype=np.uint8, shape=(flat_dim,))
+        return self._observation_space
 
     @property
     def action_space(self):
-        return Discrete(8)
+        return Discrete(self.layout.num_actions)
 
     @property
     def T(self):
@@ -82,9 +95,9 @@ class CraftingEnv(Env):
 
     def observation_to_goal(self, observation):
         completed_goals = observation[1]
-        indices = list(range(game.GOAL_LEN))
+        indices = list(range(self.layout.goal_len))
         self.random_state.shuffle(indices)
-        result = np.zeros(game.GOAL_LEN)
+        result = np.zeros(self.layout.goal_len)
         for i in indices:
             if completed_goals[i] == 1.0:
                 result[i] = 1.0
@@ -92,10 +105,101 @@ class CraftingEnv(Env):
         return None
 
     def reset(self):
-        self.seed(self.last_seed)
-        obs = self.game.render_observation()
-        obs = game.observations_for_player(obs, self.current_player)
-        obs = self.game.observation_with_goal(obs, self.current_player)
-        obs = self.actual_observation_space.flatten(obs)
+        if self.last_seed is None:
+            # Unseeded envs draw a fresh game every episode.
+            self.seed(None)
+        else:
+            self.current_player = 1
+            self.random_state.seed(self.last_seed)
+            self.game.restore(self.initial_state)
+        self.game.render_observation()
+        obs = self._observation()
         assert obs.shape == self.observation_space.shape
         return obs
+
+    def _observation(self):
+        # Gathers this player's view of `observation_buffer` in one copy.
+        return self.game.observation_buffer[
+            self.layout.player_observation_index[self.current_player - 1]]
+
+
+class BatchedCraftingEnv:
+    """Drop-in replacement for `SerialVecEnv` over `CraftingEnv`s, backed by a
+    single `BatchedGame`.
+
+    Observations are returned in `observations`, one (num_env, flat_dim)
+    uint8 array which is overwritten by the next step or reset. As in lagom's
+    vectorized envs, a finished game is reset immediately; its terminal
+    observation is returned, and the first observation of the next episode is
+    put in `info['init_observation']`.
+    """
+
+    T = CraftingEnv.T
+    max_episode_reward = CraftingEnv.max_episode_reward
+    reward_range = CraftingEnv.reward_range
+    action_space = CraftingEnv.action_space
+    observation_space = CraftingEnv.observation_space
+
+    def __init__(self, seeds, layout=game.DEFAULT_LAYOUT):
+        self.layout = layout
+        if layout is game.DEFAULT_LAYOUT:
+            self._observation_space = FLAT_OBSERVATION_SPACE
+        else:
+            _, self._observation_space = observation_spaces(layout)
+        self.game = BatchedGame(seeds, layout)
+        self.num_env = self.game.num_games
+        self.current_player = np.ones(self.num_env, dtype=np.int64)
+        self.observations = np.zeros(
+            (self.num_env, layout.player_observation_len), dtype=np.uint8)
+        self._player_observations = np.zeros((2,) + self.observations.shape,
+                                             dtype=np.uint8)
+
+    def __len__(self):
+        return self.num_env
+
+    def _observe(self):
+        self.game.render_observation()
+        for p, player_observations in enumerate(self._player_observations):
+            np.take(self.game.observation_buffer,
+                    self.layout.player_observation_index[p], axis=1,
+                    out=player_observations)
+            np.copyto(self.observations, player_observations,
+                      where=(self.current_player == p + 1)[:, None])
+        return self.observations
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions).reshape(self.num_env)
+
+    def step_wait(self):
+        player = self.current_player
+        actions = self.actions + self.layout.p2_off * (player - 1)
+        rewards, dones = self.game.step(actions)
+        goals = self.game.goals.copy()
+        self.current_player = player % 2 + 1
+        obs = self._observe()
+        infos = [{'goals': (goals[i, 0], goals[i, 1]), 'player': player[i]}
+                 for i in range(self.num_env)]
+        if np.any(dones):
+            terminal_obs = obs[dones]
+            self.game.reset(dones)
+            self.current_player[dones] = 1
+            self._observe()
+            for i in np.nonzero(dones)[0]:
+                infos[i]['init_observation'] = obs[i].copy()
+            obs[dones] = terminal_obs
+        return obs, rewards, dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def reset(self):
+        self.game.reset()
+        self.current_player[:] = 1
+        return self._observe()
+
+    def render(self, mode='human'):
+        return [self.game.render_human(i) for i in range(self.num_env)]
+
+    def close(self):
+        pass
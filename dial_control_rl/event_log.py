@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Buffered, structured logging of crafting events.
+
+Events are fixed-size `EVENT_DTYPE` records. The game appends them to the
+ring buffer of the `ACTIVE` `EventLog`, and a background thread writes them
+to disk in batches, so logging an event costs a few array assignments rather
+than opening and writing a file. Logs whose path ends in `.jsonl` hold one
+JSON object per event; any other path holds the raw records.
+"""
+
+import sys
+sys.path.append('.')
+
+import json
+import threading
+import time
+from enum import IntEnum
+from pathlib import Path
+
+import numpy as np
+
+
+class EventType(IntEnum):
+    PICKUP = 0  # An item went into an inventory slot.
+    DROP = 1  # An item was dropped from an inventory slot.
+    PUT = 2  # An item was put in the crucible or bench.
+    CRAFT = 3  # A piece of jewelry was made.
+    REWARD = 4  # A player was rewarded for a piece of jewelry.
+
+
+# Events which have no position, jewelry or item use -1, -1 and 0.
+EVENT_DTYPE = np.dtype([('env', '<u4'), ('frame', '<u4'), ('type', 'u1'),
+                        ('player', 'u1'), ('item', 'u1'), ('slot', 'u1'),
+                        ('row', '<i2'), ('col', '<i2'), ('jewelry', '<i2'),
+                        ('reward', '<f4')])
+
+# The log that the game writes to, if any.
+ACTIVE = None
+
+
+def activate(event_log):
+    """Makes `event_log` (or None) the `ACTIVE` log and returns the previous
+    one."""
+    global ACTIVE
+    previous, ACTIVE = ACTIVE, event_log
+    return previous
+
+
+def to_json(event):
+    return {'env': int(event['env']),
+            'frame': int(event['frame']),
+            'type': EventType(event['type']).name.lower(),
+            'player': int(event['player']),
+            'item': chr(event['item']) if event['item'] else None,
+            'slot': int(event['slot']),
+            'position': [int(event['row']), int(event['col'])],
+            'jewelry': int(event['jewelry']),
+            'reward': float(event['reward'])}
+
+
+def from_json(line):
+    event = json.loads(line)
+    return (event['env'], event['frame'],
+            EventType[event['type'].upper()], event['player'],
+            ord(event['item']) if event['item'] else 0, event['slot'],
+            event['position'][0], event['position'][1], event['jewelry'],
+            event['reward'])
+
+
+def read_events(path):
+    """Reads a log written by `EventLog` back into an `EVENT_DTYPE` array."""
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        with open(path) as f:
+            return np.array([from_json(line) for line in f],
+                            dtype=EVENT_DTYPE)
+    return np.fromfile(path, dtype=EVENT_DTYPE)
+
+
+class EventLog:
+    """A ring buffer of events drained to `path` by a background thread.
+
+    The thread wakes up when the buffer is half full or every
+    `flush_interval` seconds. When the buffer is full, producers wait for the
+    thread to make room rather than dropping events. If writing fails, the
+    producers, `flush` and `close` raise a `RuntimeError` instead.
+    """
+
+    def __init__(self, path, capacity=1 << 16, flush_interval=1.0,
+                 append=False):
+        self.path = Path(path)
+        self.jsonl = self.path.suffix == '.jsonl'
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        # Whether the log extends an existing file, e.g. on a resumed run.
+        self.appending = append
+        self._buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+        # Events ever appended and written; the unwritten ones are in
+        # `_buffer[written % capacity:]` up to `appended % capacity`.
+        self._appended = 0
+        self._written = 0
+        self._closed = False
+        # What stopped the writer thread, re-raised to producers.
+        self._error = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        mode = 'a' if self.appending else 'w'
+        self._file = open(self.path, mode if self.jsonl else mode + 'b')
+        self._thread = threading.Thread(target=self._run, name='EventLog',
+                                        daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        """The number of events appended so far."""
+        return self._appended
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _wait_for_room(self):
+        while self._appended - self._written == self.capacity:
+            self._check_writer()
+            self._changed.wait(self.flush_interval)
+
+    def _check_writer(self):
+        """Raises the writer thread's error, if it failed, rather than
+        waiting for it forever."""
+        if self._error is not None:
+            message = f'Writing events to {self.path} failed.'
+            raise RuntimeError(message) from self._error
+        if not self._thread.is_alive():
+            raise RuntimeError(f'The writer of {self.path} has stopped.')
+
+    def append(self, type, player=0, item=0, slot=0, position=(-1, -1),
+               jewelry=-1, reward=0.0, env=0, frame=0):
+        with self._lock:
+            self._wait_for_room()
+            self._buffer[self._appended % self.capacity] = (
+                env, frame, type, player, item, slot, position[0],
+                position[1], jewelry, reward)
+            self._appended += 1
+            if self._appended - self._written == self.capacity // 2:
+                self._changed.notify_all()
+
+    def extend(self, events):
+        """Appends an `EVENT_DTYPE` array of events."""
+        start = 0
+        with self._lock:
+            while start < len(events):
+                self._wait_for_room()
+                head = self._appended % self.capacity
+                free = self.capacity - (self._appended - self._written)
+                n = min(len(events) - start, free, self.capacity - head)
+                self._buffer[head:head + n] = events[start:start + n]
+                start += n
+                self._appended += n
+                if self._appended - self._written >= self.capacity // 2:
+                    self._changed.notify_all()
+
+    def flush(self):
+        """Blocks until every event appended so far is written."""
+        with self._lock:
+            target = self._appended
+            self._changed.notify_all()
+            while self._written < target:
+                self._check_writer()
+                self._changed.wait(self.flush_interval)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            message = f'Writing events to {self.path} failed.'
+            raise RuntimeError(message) from self._error
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._appended == self._written and not self._closed:
+                    self._changed.wait(self.flush_interval)
+                if self._appended == self._written:
+                    if self._closed:
+                        return
+                    continue
+                start = self._written % self.capacity
+                # Write up to the end of the buffer; the rest, if it wrapped
+                # around, goes in the next batch.
+                end = min(start + self._appended - self._written,
+                          self.capacity)
+            # Producers never overwrite unwritten events, so the batch can be
+            # read without holding the lock.
+            try:
+                self._write(self._buffer[start:end])
+            except BaseException as e:
+                with self._lock:
+                    self._error = e
+                    self._changed.notify_all()
+                return
+            with self._lock:
+                self._written += end - start
+                self._changed.notify_all()
+
+    def _write(self, events):
+        if self.jsonl:
+            self._file.write(''.join(json.dumps(to_json(event)) + '\n'
+                                     for event in events))
+        else:
+            self._file.write(events.tobytes())
+        self._file.flush()
+
+
+def benchmark(num_events=200000, path='/tmp/event_log_benchmark'):
+    for suffix in ('.bin', '.jsonl'):
+        with EventLog(path + suffix) as events:
+            start = time.perf_counter()
+            for i in range(num_events):
+                events.append(EventType.PICKUP, 1, ord('R'), 0, (1, 2),
+                              frame=i)
+            append_time = time.perf_counter() - start
+            events.flush()
+            total_time = time.perf_counter() - start
+        assert len(read_events(path + suffix)) == num_events
+        print(f'{suffix}: {append_time / num_events * 1e6:.2f} us/append, '
+              f'{num_events / total_time:.0f} events/sec written')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
+import atexit
 import curses
+import functools
 import numpy as np
 import sys
 sys.path.append('.')
@@ -12,6 +14,8 @@ from enum import IntEnum, unique
 from pycolab import human_ui, engine, things
 
 from dial_control_rl import ascii_art
+from dial_control_rl import event_log
+from dial_control_rl.event_log import EventType
 
 BACKGROUND = [
     ' M  W ',
@@ -95,17 +99,41 @@ GOAL_LEN = (JEWELRY_LEN) + len(ITEMS)
 assert GOAL_LEN == 38
 GOAL_REWARD = 100
 
+LOG_FILE = None
+
+
+def close_log():
+    global LOG_FILE
+    if LOG_FILE is not None:
+        LOG_FILE.close()
+        LOG_FILE = None
+
+
+# Flush the last messages when the game exits.
+atexit.register(close_log)
+
 
 def clear_log():
-    with open('dial_control.log', 'w'):
-        pass
+    global LOG_FILE
+    close_log()
+    # Line buffered, so that a crash or kill loses no messages.
+    LOG_FILE = open('dial_control.log', 'w', buffering=1)
 
 
 def log(msg):
     if PLAYING:
-        with open('dial_control.log', 'a') as f:
-            f.write(msg)
-            f.write('\n')
+        LOG_FILE.write(msg)
+        LOG_FILE.write('\n')
+
+
+def log_event(the_plot, type, player, item=None, slot=0, position=(-1, -1),
+              jewelry=-1, reward=0.0):
+    """Appends an event to the active `event_log.EventLog`, if any."""
+    events = event_log.ACTIVE
+    if events is not None:
+        events.append(type, player, ord(item) if item else 0, slot, position,
+                      jewelry, reward, the_plot.get(ENV_ID, 0),
+                      the_plot.frame)
 
 
 class Action(IntEnum):
@@ -117,21 +145,226 @@ class Action(IntEnum):
     ITEM1 = 5
     ITEM2 = 6
     ITEM3 = 7
-    QUIT = 8
+    # Beyond both players' actions, so that only the human UI can quit.
+    QUIT = 16
 
 
 P2_OFF = Action.ITEM3 + 1
 CRUCIBLE_ITEMS = ('crucible_items',)
 BENCH_ITEMS = ('bench_items',)
 JEWELRY_CONSTRUCTED = ('jewelry_constructed',)
+LAYOUT = ('layout',)
+# Identifies the game in logged events.
+ENV_ID = ('env_id',)
+# Maps positions to a bitmask of the z-order indices of the visible things
+# there.
+OCCUPANCY = ('occupancy',)
+
 
+# Characters for gems, metals and drop slots beyond the default ones.
+SPARE_CHARACTERS = ('30EFHIKLNQTUVXYZabcdefghijklmnopqrstuvwxyz'
+                    '!#$%&*+-/<=>?@^_~')
 
-def move(x, y, direction):
+
+def split_observation(buffer, layout=None):
+    """Views of the parts of an `observation_buffer`, or of a batch of them
+    stacked along the first axis."""
+    layout = layout or DEFAULT_LAYOUT
+    batch_shape = buffer.shape[:-1]
+    offsets = layout.observation_offsets
+    return tuple(buffer[..., start:end].reshape(batch_shape + shape)
+                 for start, end, shape in zip(offsets[:-1], offsets[1:],
+                                              layout.observation_parts))
+
+
+def observations_for_player(obs, player):
+    if player == 1:
+        return obs
+    else:
+        grid, inv1, inv2, player1, player2, completed = obs
+        return (grid, inv2, inv1, player2, player1, completed)
+
+
+def player_observation_index(player, layout=None):
+    """Indices into `Engine.observation_buffer` which gather the flattened
+    `observation_with_goal(observations_for_player(obs, player), player)`."""
+    layout = layout or DEFAULT_LAYOUT
+    index = split_observation(np.arange(layout.observation_buffer_len), layout)
+    grid, inv1, inv2, player1, player2, completed = \
+        observations_for_player(index[:6], player)
+    goal = index[6 + player - 1]
+    return np.concatenate([part.ravel() for part in
+                           (grid, inv2, inv1, player2, player1, completed,
+                            goal)])
+
+
+class Layout:
+    """Sizes and contents of a crafting game.
+
+    The default arguments give the original 6x4 game, `DEFAULT_LAYOUT`, which
+    the module-level constants describe. Larger maps keep its arrangement:
+    mountains and water one column in from the edges, the bench and crucible
+    in the middle of the bottom row, and the players above them on the top
+    row. Items fill the outer columns first, then columns further in.
+    Gems, metals and drop slots beyond the default ones use
+    `SPARE_CHARACTERS`.
+    """
+
+    def __init__(self, map_width=MAP_WIDTH, map_height=MAP_HEIGHT,
+                 num_gems=len(GEMS), num_metals=len(METALS),
+                 num_drop_slots=len(DROPPED_ITEMS), inv_size=INV_SIZE):
+        if min(num_gems, num_metals, num_drop_slots, inv_size) < 1:
+            raise ValueError('Layouts need at least one gem, metal, drop '
+                             'slot and inventory slot.')
+        if map_height < 2 or map_width < max(4, 2 * inv_size):
+            raise ValueError(f'A {map_width}x{map_height} map cannot fit the '
+                             f'places, players and {2 * inv_size} inventory '
+                             'slots.')
+        spare = list(SPARE_CHARACTERS)
+        extra = (max(num_gems - len(GEMS), 0) +
+                 max(num_metals - len(METALS), 0) +
+                 max(num_drop_slots - len(DROPPED_ITEMS), 0))
+        if extra > len(spare):
+            raise ValueError(f'Only {len(spare)} spare characters, but '
+                             f'{extra} are needed.')
+
+        def take(defaults, n):
+            return (defaults[:n] +
+                    [spare.pop(0) for _ in range(n - len(defaults))])
+
+        self.map_width = map_width
+        self.map_height = map_height
+        self.inv_size = inv_size
+        self.gems = take(GEMS, num_gems)
+        self.metals = take(METALS, num_metals)
+        self.items = self.gems + self.metals + [COAL]
+        self.dropped_items = take(DROPPED_ITEMS, num_drop_slots)
+        gem_names = ['Ruby', 'Amethyst', 'Diamond', 'Jade', 'Pearl']
+        metal_names = ['Silver', 'Gold']
+        self.gem_names = [gem_names[i] if i < len(gem_names) else f'Gem {i}'
+                          for i in range(num_gems)]
+        self.metal_names = [metal_names[i] if i < len(metal_names)
+                            else f'Metal {i}' for i in range(num_metals)]
+
+        left, right = map_width // 2 - 1, map_width // 2
+        rows = []
+        for row in range(map_height):
+            line = [' '] * map_width
+            line[1] = MOUNTAIN
+            line[-2] = WATER
+            rows.append(line)
+        rows[-1][left] = BENCH
+        rows[-1][right] = CRUCIBLE
+        rows.append([' '] * map_width)
+        self.background = [''.join(row) for row in rows]
+        self.player_starts = [(0, left), (0, right)]
+        taken = set(self.player_starts) | {(map_height - 1, left),
+                                           (map_height - 1, right)}
+        columns = []
+        for col in range(map_width // 2 + map_width % 2):
+            columns += [col, map_width - 1 - col]
+        self.item_cells = [(row, col) for col in dict.fromkeys(columns)
+                           for row in range(map_height)
+                           if (row, col) not in taken][:len(self.items)]
+        if len(self.item_cells) < len(self.items):
+            raise ValueError(f'A {map_width}x{map_height} map cannot fit '
+                             f'{len(self.items)} items.')
+
+        self.jewelry_len = self.jewelry_index(JewelryShape.BRACELET,
+                                              num_metals - 1,
+                                              num_gems - 1) + 1
+        self.goal_len = self.jewelry_len + len(self.items)
+        self.jewelry_names = [f'{metal} {shape.name.capitalize()} with {gem}'
+                              for shape in JewelryShape
+                              for metal in self.metal_names
+                              for gem in self.gem_names]
+        self.num_actions = Action.ITEM1 + inv_size
+        self.p2_off = self.num_actions
+        # Past both players' actions, as in the default game, so that no
+        # player's action ends the game.
+        self.quit = 2 * self.p2_off
+
+        # Back to front; dropped items are painted over native ones, players
+        # over all.
+        native = 'RGADSJOP'
+        items = sorted(self.items, key=lambda c: (c not in native,
+                                                  native.find(c),
+                                                  self.items.index(c)))
+        self.z_order = ''.join([CRUCIBLE, BENCH] + items +
+                               self.dropped_items + [PLAYER_1, PLAYER_2])
+        self.z_index = {c: z for z, c in enumerate(self.z_order)}
+        # Maps the code of every character which appears in the observation
+        # grid (everything but the players in the z-order) to itself, and
+        # everything else to 0.
+        self.grid_codes = np.zeros(256, dtype=np.uint8)
+        for c in self.z_order[:-2]:
+            self.grid_codes[ord(c)] = ord(c)
+
+        grid_shape = (map_height, map_width)
+        # Shapes of the parts of `Engine.observation_buffer`: grid, inv1,
+        # inv2, player1_grid, player2_grid and completed (as returned by
+        # `render_observation`), then the goal of each player.
+        self.observation_parts = [grid_shape, (inv_size,), (inv_size,),
+                                  grid_shape, grid_shape, (self.goal_len,),
+                                  (self.goal_len,), (self.goal_len,)]
+        self.observation_offsets = np.cumsum(
+            [0] + [int(np.prod(shape)) for shape in self.observation_parts])
+        self.observation_buffer_len = int(self.observation_offsets[-1])
+        # Row `player - 1` holds `player_observation_index(player)`.
+        self.player_observation_index = np.stack(
+            [player_observation_index(player, self) for player in (1, 2)])
+        self.player_observation_len = self.player_observation_index.shape[1]
+
+    def jewelry_index(self, shape, metal, gem):
+        return (gem +
+                len(self.gems) * metal +
+                len(self.gems) * len(self.metals) * shape)
+
+
+DEFAULT_LAYOUT = Layout()
+assert DEFAULT_LAYOUT.background == BACKGROUND
+assert DEFAULT_LAYOUT.jewelry_names == JEWELRY_NAMES
+assert DEFAULT_LAYOUT.z_order == 'CBRGADSJOP98765412'
+Z_ORDER = DEFAULT_LAYOUT.z_order
+GRID_CODES = DEFAULT_LAYOUT.grid_codes
+OBSERVATION_PARTS = DEFAULT_LAYOUT.observation_parts
+OBSERVATION_OFFSETS = DEFAULT_LAYOUT.observation_offsets
+OBSERVATION_BUFFER_LEN = DEFAULT_LAYOUT.observation_buffer_len
+PLAYER_OBSERVATION_INDEX = DEFAULT_LAYOUT.player_observation_index
+PLAYER_OBSERVATION_LEN = DEFAULT_LAYOUT.player_observation_len
+
+
+def occupy(the_plot, character, position):
+    occupancy = the_plot[OCCUPANCY]
+    bit = 1 << the_plot[LAYOUT].z_index[character]
+    occupancy[position] = occupancy.get(position, 0) | bit
+
+
+def vacate(the_plot, character, position):
+    bit = 1 << the_plot[LAYOUT].z_index[character]
+    the_plot[OCCUPANCY][position] &= ~bit
+
+
+def things_at(the_plot, position):
+    """Yield the characters of the visible things at `position` in z-order.
+    The cell is re-read after each one, so things placed there meanwhile
+    further along the z-order are still visited."""
+    z = 0
+    while True:
+        bits = the_plot[OCCUPANCY].get(position, 0) >> z
+        if not bits:
+            return
+        z += (bits & -bits).bit_length() - 1
+        yield the_plot[LAYOUT].z_order[z]
+        z += 1
+
+
+def move(x, y, direction, width=MAP_WIDTH, height=MAP_HEIGHT):
     dx = [0, 0, -1, 1][direction]
     dy = [-1, 1, 0, 0][direction]
     new_x = x + dx
     new_y = y + dy
-    if 0 <= new_x < MAP_WIDTH and 0 <= new_y < MAP_HEIGHT:
+    if 0 <= new_x < width and 0 <= new_y < height:
         return (new_x, new_y)
     else:
         return (x, y)
@@ -144,12 +377,14 @@ class Player(things.Sprite):
         self._player = int(character)
 
     def update(self, actions, board, layers, backdrop, all_things, the_plot):
-        if actions == Action.QUIT:
+        layout = the_plot[LAYOUT]
+        if actions == layout.quit:
             the_plot.terminate_episode()
+            return
         if actions is None:
             return
-        player = 1 + int(actions >= P2_OFF)
-        action = actions % P2_OFF
+        player = 1 + int(actions >= layout.p2_off)
+        action = actions % layout.p2_off
         if player != self._player:
             return
         if not the_plot.get(('goal_complete', player), False):
@@ -157,62 +392,80 @@ class Player(things.Sprite):
         if action != Action.SKIP:
             the_plot.add_reward(-1)
         if Action.UP <= action <= Action.RIGHT:
-            self.update_move(action)
-        if Action.ITEM1 <= action <= Action.ITEM3:
+            self.update_move(action, the_plot)
+        if Action.ITEM1 <= action < Action.ITEM1 + layout.inv_size:
             self.update_item(action, all_things, the_plot)
 
-    def update_move(self, action):
+    def update_move(self, action, the_plot):
+        layout = the_plot[LAYOUT]
         x, y = move(self._position.col, self._position.row,
-                    action - Action.UP)
+                    action - Action.UP, layout.map_width, layout.map_height)
+        vacate(the_plot, self.character, self._position)
         self._position = self.Position(y, x)
+        occupy(the_plot, self.character, self._position)
 
     def update_item(self, action, all_things, the_plot):
+        layout = the_plot[LAYOUT]
         slot = action - Action.ITEM1
         found_thing = False
-        for c, thing in all_things.items():
-            if thing.position == self.position and thing.visible:
-                if c in ITEMS:
-                    log(f'Player #{self._player} picked up {c!r} to '
-                        f'slot {slot}.')
-                    the_plot[('inv', self._player, slot)] = thing.character
+        for c in things_at(the_plot, self.position):
+            thing = all_things[c]
+            if c in layout.items:
+                log(f'Player #{self._player} picked up {c!r} to '
+                    f'slot {slot}.')
+                log_event(the_plot, EventType.PICKUP, self._player, c, slot,
+                          self.position)
+                the_plot[('inv', self._player, slot)] = thing.character
+                found_thing = True
+            item = the_plot.get(('inv', self._player, slot), None)
+            if thing.character == CRUCIBLE:
+                if item is not None:
+                    found_thing = True
+                    log(f'Player #{self._player} put {item!r} in '
+                        'crucible.')
+                    log_event(the_plot, EventType.PUT, self._player, item,
+                              slot, self.position)
+                    make_crucible_jewelry(self._player, the_plot, item)
+                else:
+                    log(f'Player #{self._player} has no item in {slot}')
+            if thing.character == BENCH:
+                if item is not None:
                     found_thing = True
-                item = the_plot.get(('inv', self._player, slot), None)
-                if thing.character == CRUCIBLE:
-                    if item is not None:
-                        found_thing = True
-                        log(f'Player #{self._player} put {item!r} in '
-                            'crucible.')
-                        make_crucible_jewelry(self._player, the_plot, item)
-                    else:
-                        log(f'Player #{self._player} has no item in {slot}')
-                if thing.character == BENCH:
-                    if item is not None:
-                        found_thing = True
-                        log(f'Player #{self._player} put {item!r} in bench.')
-                        make_bench_jewelry(self._player, the_plot, item)
-                    else:
-                        log(f'Player #{self._player} has no item in {slot}')
-                if not found_thing and thing.character in DROPPED_ITEMS:
-                    drop_slot = all_things[thing.character]
-                    picked_up_item = drop_slot.item
-                    if picked_up_item is not None:
-                        # Don't set found_thing, so that we will also drop, below.
-                        log(f'Player #{self._player} picking up dropped '
-                            f'{picked_up_item!r} to slot {slot}.')
-                        the_plot[('inv', self._player, slot)] = picked_up_item
-                        drop_slot.unfill()
-                if not found_thing:
-                    if item is not None:
-                        found_thing = True
-                        next_drop_index = the_plot.get('drop_item_index', 0)
-                        the_plot['drop_item_index'] = ((next_drop_index + 1) %
-                                                       len(DROPPED_ITEMS))
-                        drop_char = DROPPED_ITEMS[next_drop_index]
-                        drop_slot = all_things[drop_char]
-                        drop_slot.fill(self.position, item)
-                        the_plot['remap'][drop_char] = item
-                        log(f'Player #{self._player} dropped {item!r} at '
-                            f'{drop_slot.position}')
+                    log(f'Player #{self._player} put {item!r} in bench.')
+                    log_event(the_plot, EventType.PUT, self._player, item,
+                              slot, self.position)
+                    make_bench_jewelry(self._player, the_plot, item)
+                else:
+                    log(f'Player #{self._player} has no item in {slot}')
+            if not found_thing and thing.character in layout.dropped_items:
+                drop_slot = all_things[thing.character]
+                picked_up_item = drop_slot.item
+                if picked_up_item is not None:
+                    # Don't set found_thing, so that we will also drop, below.
+                    log(f'Player #{self._player} picking up dropped '
+                        f'{picked_up_item!r} to slot {slot}.')
+                    log_event(the_plot, EventType.PICKUP, self._player,
+                              picked_up_item, slot, self.position)
+                    the_plot[('inv', self._player, slot)] = picked_up_item
+                    vacate(the_plot, drop_slot.character, drop_slot.position)
+                    drop_slot.unfill()
+            if not found_thing:
+                if item is not None:
+                    found_thing = True
+                    next_drop_index = the_plot.get('drop_item_index', 0)
+                    the_plot['drop_item_index'] = ((next_drop_index + 1) %
+                                                   len(layout.dropped_items))
+                    drop_char = layout.dropped_items[next_drop_index]
+                    drop_slot = all_things[drop_char]
+                    if drop_slot.visible:
+                        vacate(the_plot, drop_char, drop_slot.position)
+                    drop_slot.fill(self.position, item)
+                    occupy(the_plot, drop_char, drop_slot.position)
+                    the_plot['remap'][drop_char] = item
+                    log(f'Player #{self._player} dropped {item!r} at '
+                        f'{drop_slot.position}')
+                    log_event(the_plot, EventType.DROP, self._player, item,
+                              slot, self.position)
 
 
 def make_crucible_jewelry(player, the_plot, item):
@@ -241,42 +494,47 @@ def make_bench_jewelry(player, the_plot, item):
 
 
 def make_from(player, the_plot, shape, items):
-    metals = get_metals(items)
-    gems = get_gems(items)
+    layout = the_plot[LAYOUT]
+    metals = get_metals(items, layout)
+    gems = get_gems(items, layout)
     if len(metals) == 1 and len(gems) == 1:
-        give_reward(player, the_plot, jewelry_index(shape,
-                                                    metal_index(metals[0]),
-                                                    gem_index(gems[0])))
+        give_reward(player, the_plot,
+                    layout.jewelry_index(shape,
+                                         metal_index(metals[0], layout),
+                                         gem_index(gems[0], layout)))
     else:
         log(f'Cannot make {shape.name.lower()} from {items!r}.')
 
 
-def get_metals(items):
-    return [item for item in items if item in METALS]
+def get_metals(items, layout=None):
+    return [item for item in items if item in (layout or DEFAULT_LAYOUT).metals]
 
 
-def get_gems(items):
-    return [item for item in items if item in GEMS]
+def get_gems(items, layout=None):
+    return [item for item in items if item in (layout or DEFAULT_LAYOUT).gems]
 
 
-def metal_index(m):
-    return METALS.index(m)
+def metal_index(m, layout=None):
+    return (layout or DEFAULT_LAYOUT).metals.index(m)
 
 
-def gem_index(g):
-    return GEMS.index(g)
+def gem_index(g, layout=None):
+    return (layout or DEFAULT_LAYOUT).gems.index(g)
 
 
 def give_reward(player, the_plot, jewelry_idx):
     the_plot[JEWELRY_CONSTRUCTED].add(jewelry_idx)
+    log_event(the_plot, EventType.CRAFT, player, jewelry=jewelry_idx)
     for p in (1, 2):
         player_goal = the_plot[('goal', p)]
         reward = player_goal[jewelry_idx] * GOAL_REWARD
         log(f'Giving reward {reward} to Player {p} for '
-            f'{JEWELRY_NAMES[jewelry_idx]}.')
+            f'{the_plot[LAYOUT].jewelry_names[jewelry_idx]}.')
         the_plot.add_reward(reward)
         if reward > 0:
             the_plot[('goal_complete', p)] = True
+            log_event(the_plot, EventType.REWARD, p, jewelry=jewelry_idx,
+                      reward=reward)
 
 
 class Item(things.Sprite):
@@ -317,8 +575,13 @@ class DropSlot(things.Sprite):
 
 class Engine(engine.Engine):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, layout=DEFAULT_LAYOUT, **kwargs):
+        self.layout = layout
         self.remapping = {}
+        self.observation_buffer = np.zeros(layout.observation_buffer_len,
+                                           dtype=np.uint8)
+        self._observation_views = split_observation(self.observation_buffer,
+                                                    layout)
         super(Engine, self).__init__(*args, **kwargs)
 
     def _render(self):
@@ -342,10 +605,11 @@ class Engine(engine.Engine):
                 self._renderer.paint_sprite(c, entity.position)
             elif isinstance(entity, things.Drape):
                 self._renderer.paint_drape(c, entity.curtain)
+        inv_size = self.layout.inv_size
         for player in (1, 2):
-            for inv_slot in (0, 1, 2):
-                col = INV_SIZE * (player - 1) + inv_slot
-                pos = things.Sprite.Position(MAP_HEIGHT, col)
+            for inv_slot in range(inv_size):
+                col = inv_size * (player - 1) + inv_slot
+                pos = things.Sprite.Position(self.layout.map_height, col)
                 c = self.the_plot.get(('inv', player, inv_slot), ' ')
                 self._renderer.paint_sprite(c, pos)
         # Done with all the layers; render the board!
@@ -356,105 +620,125 @@ class Engine(engine.Engine):
                          for line in self._board.board)
 
     def render_array(self):
-        return np.array([[COLOURS[chr(c)] for c in line]
+        # Characters of larger layouts which have no colour are grey.
+        return np.array([[COLOURS.get(chr(c), (128, 128, 128)) for c in line]
                          for line in self._board.board])
 
     def render_completed(self):
-        completed = self.the_plot[JEWELRY_CONSTRUCTED]
-        return np.array([1 if jewelry in completed else 0
-                         for jewelry in range(GOAL_LEN)],
-                        dtype=np.uint8)
+        completed = np.zeros(self.layout.goal_len, dtype=np.uint8)
+        completed[list(self.the_plot[JEWELRY_CONSTRUCTED])] = 1
+        return completed
 
     def render_observation(self):
-        obs = self._board
-        grid = np.zeros((MAP_HEIGHT, MAP_WIDTH), dtype=np.uint8)
-        for c in 'CBRGADSJOP987654':
-            c = self.remapping.get(c, c)
-            mask = obs.layers[c][:-1]
-            grid[(grid == 0) & mask] = ord(c)
-        player1_grid = np.array(obs.layers['1'][:-1], dtype=np.uint8)
-        player2_grid = np.array(obs.layers['2'][:-1], dtype=np.uint8)
-        inv1 = np.array([ord(self.the_plot.get(('inv', 1, i), ' '))
-                         for i in range(INV_SIZE)])
-        inv2 = np.array([ord(self.the_plot.get(('inv', 2, i), ' '))
-                         for i in range(INV_SIZE)])
-        completed = self.render_completed()
-        return (grid, inv1, inv2, player1_grid, player2_grid, completed)
+        """Encode the board and both goals into `observation_buffer` and
+        return views of the board parts. The views are overwritten by the
+        next call."""
+        board = self._board.board
+        (grid, inv1, inv2, player1_grid, player2_grid, completed,
+         goal1, goal2) = self._observation_views
+        # The board already resolves occlusion, so a single lookup finds the
+        # top-most place or item (dropped ones are remapped) in each cell.
+        np.take(self.layout.grid_codes, board[:-1], out=grid)
+        np.equal(board[:-1], ord(PLAYER_1), out=player1_grid)
+        np.equal(board[:-1], ord(PLAYER_2), out=player2_grid)
+        # Inventories are painted on the bottom row by `_render`.
+        inv_size = self.layout.inv_size
+        inv1[:] = board[-1, :inv_size]
+        inv2[:] = board[-1, inv_size:2 * inv_size]
+        completed[:] = 0
+        completed[list(self.the_plot[JEWELRY_CONSTRUCTED])] = 1
+        goal1[:] = self.the_plot[('goal', 1)]
+        goal2[:] = self.the_plot[('goal', 2)]
+        return self._observation_views[:6]
+
+    def index_things(self):
+        """Rebuild the position index used by `things_at` from scratch."""
+        self.the_plot[OCCUPANCY] = {}
+        for c, thing in self._sprites_and_drapes.items():
+            if thing.visible:
+                occupy(self.the_plot, c, thing.position)
 
     def goals(self):
         return self.the_plot[('goal', 1)], self.the_plot[('goal', 2)]
 
+    def snapshot(self):
+        """Capture everything `play` can change, for use with `restore`."""
+        sprites = {c: (thing._position, thing._visible,
+                       getattr(thing, 'item', None))
+                   for c, thing in self._sprites_and_drapes.items()}
+        plot = {k: v for k, v in self.the_plot.items()
+                if k not in ('remap', OCCUPANCY)}
+        plot[JEWELRY_CONSTRUCTED] = set(plot[JEWELRY_CONSTRUCTED])
+        return (sprites, plot, dict(self.remapping), self.the_plot.frame)
+
+    def restore(self, snapshot):
+        """Put the game back in the state captured by `snapshot`, without
+        building a new engine."""
+        sprites, plot, remapping, frame = snapshot
+        for c, (position, visible, item) in sprites.items():
+            thing = self._sprites_and_drapes[c]
+            thing._position = position
+            thing._visible = visible
+            if isinstance(thing, DropSlot):
+                thing.item = item
+        self.remapping.clear()
+        self.remapping.update(remapping)
+        self.the_plot.clear()
+        self.the_plot.update(plot)
+        self.the_plot['remap'] = self.remapping
+        self.the_plot[JEWELRY_CONSTRUCTED] = set(plot[JEWELRY_CONSTRUCTED])
+        self.the_plot._frame = frame
+        self.index_things()
+        self._game_over = False
+        self._render()
+
     def observation_with_goal(self, obs, player):
         grid, inv1, inv2, player1, player2, completed = obs
         goal = self.the_plot[('goal', player)]
         return (grid, inv2, inv1, player2, player1, completed, goal)
 
-def observations_for_player(obs, player):
-    if player == 1:
-        return obs
-    else:
-        grid, inv1, inv2, player1, player2, completed = obs
-        return (grid, inv2, inv1, player2, player1, completed)
-
-
-def gen_start(random_state):
-    items_copy = list(ITEMS)
-    background_copy = [list(row) for row in BACKGROUND]
-    background_copy[0][2] = '1'
-    background_copy[0][3] = '2'
+def gen_start(random_state, layout=DEFAULT_LAYOUT):
+    items_copy = list(layout.items)
+    background_copy = [list(row) for row in layout.background]
+    for player, (row, col) in zip((PLAYER_1, PLAYER_2), layout.player_starts):
+        background_copy[row][col] = player
     random_state.shuffle(items_copy)
-    for index, item in enumerate(items_copy):
-        if index < 4:
-            background_copy[index][0] = item
-        else:
-            background_copy[index - 4][5] = item
+    for (row, col), item in zip(layout.item_cells, items_copy):
+        background_copy[row][col] = item
     return [''.join(row) for row in background_copy]
 
 
-def make_game(seed=None):
+def make_game(seed=None, layout=DEFAULT_LAYOUT, env_id=0):
     random_state = np.random.RandomState(seed)
+    sprites = {PLAYER_1: Player, PLAYER_2: Player,
+               CRUCIBLE: Place, BENCH: Place}
+    sprites.update((item, Item) for item in layout.items)
+    sprites.update((drop_char, DropSlot) for drop_char in layout.dropped_items)
     engine = ascii_art.ascii_art_to_game(
-        gen_start(random_state),
+        gen_start(random_state, layout),
         what_lies_beneath=' ',
-        sprites={
-            '1': Player,
-            '2': Player,
-            RUBY: Item,
-            GOLD: Item,
-            AMETHYST: Item,
-            DIAMOND: Item,
-            SILVER: Item,
-            JADE: Item,
-            COAL: Item,
-            PEARL: Item,
-            CRUCIBLE: Place,
-            BENCH: Place,
-
-            '9': DropSlot,
-            '8': DropSlot,
-            '7': DropSlot,
-            '6': DropSlot,
-            '5': DropSlot,
-            '4': DropSlot,
-            },
-        z_order='CBRGADSJOP98765412',
-        game_class=Engine)
+        sprites=sprites,
+        z_order=layout.z_order,
+        game_class=functools.partial(Engine, layout=layout))
+    engine.the_plot[LAYOUT] = layout
+    engine.the_plot[ENV_ID] = env_id
     engine.the_plot['remap'] = engine.remapping
     engine.the_plot[JEWELRY_CONSTRUCTED] = set()
+    engine.index_things()
     for player in (1, 2):
-        player_goal = np.zeros(GOAL_LEN)
-        player_goal_index = random_state.randint(0, JEWELRY_LEN - 1)
+        player_goal = np.zeros(layout.goal_len)
+        player_goal_index = random_state.randint(0, layout.jewelry_len - 1)
         log(f'Giving Player {player} the goal of '
-            f'{JEWELRY_NAMES[player_goal_index]}.')
+            f'{layout.jewelry_names[player_goal_index]}.')
         player_goal[player_goal_index] = 1.0
         engine.the_plot[('goal', player)] = player_goal
 
     return engine
 
 
-def action_for_player(action, player):
+def action_for_player(action, player, layout=DEFAULT_LAYOUT):
     if player == 2:
-        return P2_OFF + action
+        return layout.p2_off + action
     else:
         return action
 
@@ -464,6 +748,8 @@ def main():
     global PLAYING
     PLAYING = True
     clear_log()
+    events = event_log.EventLog('dial_control_events.jsonl')
+    event_log.activate(events)
 
     game = make_game()
 
@@ -495,6 +781,8 @@ def main():
         delay=50, colour_fg=COLOURS)
 
     ui.play(game)
+    event_log.activate(None)
+    events.close()
 
 
 if __name__ == '__main__':
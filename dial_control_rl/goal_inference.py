@@ -7,6 +7,7 @@ import numpy as np
 from pprint import pprint
 from enum import IntEnum, unique
 from dial_control_rl import game
+from dial_control_rl.dialogue_acts import DialogueAct, Intent
 
 
 def dist(abrev, name):
@@ -28,6 +29,7 @@ ABBREVS = [('G', 'Gold'),
      ('I', 'Ring')]
 
 DISTS = dict([(abrev, dist(abrev, name)) for (abrev, name) in ABBREVS])
+ABBREV_OF = dict([(name.lower(), abrev) for (abrev, name) in ABBREVS])
 
 
 @unique
@@ -48,6 +50,36 @@ class ForwardChannelAct(IntEnum):
     DISCONFIRM = 3
 
 
+def forward_channel(act, previous=None):
+    """The `ForwardChannelAct` and abbreviations that a `DialogueAct` of the
+    other player amounts to, or None if it says nothing about their goal.
+
+    Yes and no answers ("sure", "no thanks", parsed as `ACCEPT_OFFER` and
+    `DECLINE_OFFER`) depend on the `DialogueAct` they answer, `previous`:
+    they confirm or disconfirm a `CONFIRM_GOAL` question, and put an item
+    offered by `OFFER_ITEM` in or out of the goal.
+    """
+    if act.intent == Intent.GIVE_GOAL:
+        return ForwardChannelAct.PART_OF_GOAL, [ABBREV_OF[act.metal],
+                                                ABBREV_OF[act.gem],
+                                                ABBREV_OF[act.shape]]
+    elif act.intent in (Intent.USE, Intent.REQUEST):
+        return ForwardChannelAct.PART_OF_GOAL, [ABBREV_OF[act.item]]
+    elif act.intent == Intent.GOAL_CONFIRMED:
+        return ForwardChannelAct.CONFIRM, []
+    elif (act.intent in (Intent.ACCEPT_OFFER, Intent.DECLINE_OFFER) and
+          previous is not None):
+        accepted = act.intent == Intent.ACCEPT_OFFER
+        if previous.intent == Intent.CONFIRM_GOAL:
+            return (ForwardChannelAct.CONFIRM if accepted
+                    else ForwardChannelAct.DISCONFIRM), []
+        elif previous.intent == Intent.OFFER_ITEM:
+            return (ForwardChannelAct.PART_OF_GOAL if accepted
+                    else ForwardChannelAct.NOT_PART_OF_GOAL,
+                    [ABBREV_OF[previous.item]])
+    return None
+
+
 @unique
 class InferenceState(IntEnum):
     UNCERTAIN = 0
@@ -69,30 +101,100 @@ class GoalInference:
         self.conf_not_goal = np.zeros(game.GOAL_LEN)
         self.confirmed = False
 
+    # The net confidence, state, most likely goal, its margin over the next
+    # most likely one and the goals' order are computed once after the
+    # confidences or `confirmed` are assigned, and cached until they are
+    # assigned again.
+    # Changing the confidence arrays in place does not update them.
+
     @property
-    def net_confidence(self):
-        return np.clip(self.conf_per_goal - self.conf_not_goal, 0, 1)
+    def conf_per_goal(self):
+        return self._conf_per_goal
+
+    @conf_per_goal.setter
+    def conf_per_goal(self, conf_per_goal):
+        self._conf_per_goal = conf_per_goal
+        self._inference = None
 
     @property
-    def state(self):
-        most_likely_goal = np.argmax(self.net_confidence)
-        p = np.array(self.net_confidence)
+    def conf_not_goal(self):
+        return self._conf_not_goal
+
+    @conf_not_goal.setter
+    def conf_not_goal(self, conf_not_goal):
+        self._conf_not_goal = conf_not_goal
+        self._inference = None
+
+    @property
+    def confirmed(self):
+        return self._confirmed
+
+    @confirmed.setter
+    def confirmed(self, confirmed):
+        self._confirmed = confirmed
+        self._inference = None
+
+    def _infer(self):
+        if self._inference is not None:
+            return self._inference
+        net_confidence = np.clip(self.conf_per_goal - self.conf_not_goal, 0, 1)
+        net_confidence.flags.writeable = False
+        most_likely_goal = np.argmax(net_confidence)
+        p = np.array(net_confidence)
         p[most_likely_goal] = 0.0
         next_most_likely = np.argmax(p)
-        conf_most_likely = self.net_confidence[most_likely_goal]
-        conf_2nd_likely = self.net_confidence[next_most_likely]
+        conf_most_likely = net_confidence[most_likely_goal]
+        conf_2nd_likely = net_confidence[next_most_likely]
         relative_conf = conf_most_likely - conf_2nd_likely
         if relative_conf > self.certainty_threshold:
             if self.confirmed:
-                return InferenceState.CONFIRMED, most_likely_goal
+                state = InferenceState.CONFIRMED
             else:
-                return InferenceState.UNCONFIRMED, most_likely_goal
+                state = InferenceState.UNCONFIRMED
         elif np.min(self.conf_not_goal) > 1 - self.certainty_threshold:
-            return InferenceState.CONFUSED, most_likely_goal
+            state = InferenceState.CONFUSED
         else:
-            return InferenceState.UNCERTAIN, most_likely_goal
+            state = InferenceState.UNCERTAIN
+        # The goals ordered by net confidence are only sorted when asked for.
+        self._inference = [net_confidence, state, most_likely_goal,
+                           relative_conf, None]
+        return self._inference
+
+    @property
+    def net_confidence(self):
+        """A read-only array of the net confidence in each goal."""
+        return self._infer()[0]
 
-    def forward_act(self, act, abbrevs, confidences):
+    @property
+    def state(self):
+        _, state, most_likely_goal = self._infer()[:3]
+        return state, most_likely_goal
+
+    @property
+    def margin(self):
+        """How much more confident the inference is in the most likely goal
+        than in the next most likely one."""
+        return self._infer()[3]
+
+    def top_goals(self, k):
+        """The `k` goals with the highest net confidence, most likely first."""
+        inference = self._infer()
+        if inference[4] is None:
+            # Ties are broken by goal, as `np.argmax` does.
+            inference[4] = np.argsort(-inference[0], kind='stable')
+        return inference[4][:k]
+
+    def forward_act(self, act, abbrevs=(), confidences=None, previous=None):
+        """Updates the inference with a `ForwardChannelAct` about the goals
+        `abbrevs` with `confidences`, one by default, or with a
+        `DialogueAct` answering `previous`, as in `forward_channel`."""
+        if isinstance(act, DialogueAct):
+            forward = forward_channel(act, previous)
+            if forward is None:
+                return BackChannelAct.NO_PROGRESS, None
+            act, abbrevs = forward
+        if confidences is None:
+            confidences = len(abbrevs) * [1.0]
         for a in abbrevs:
             assert a in DISTS
         for c in confidences:
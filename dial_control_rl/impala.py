@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""IMPALA-style actor-learner training on one CPU-only machine.
+
+Actor processes step their own `CraftingEnv`s with a local copy of `Policy`
+and push fixed-length unrolls through a queue. The learner trains on batches
+of unrolls with V-trace corrections for the actors' stale policies and
+publishes its weights through shared memory, which actors reload every
+`impala.sync_interval` unrolls. The learner reports its throughput in env
+frames per second and the policy lag, the number of learner updates between
+the policy an unroll was collected with and the one trained on it.
+
+As in `Agent.learn`, only player 1's turns, the even steps of each unroll,
+are trained on. Unlike `train.py`, observations are not standardized, since
+the actors would need to share running statistics.
+"""
+
+import sys
+sys.path.append('.')
+
+import queue
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.nn.functional as F
+from lagom.envs import EnvSpec
+from lagom.experiment import Configurator
+
+from dial_control_rl import event_log, returns
+from dial_control_rl.agent import Policy
+from dial_control_rl.env import CraftingEnv
+from dial_control_rl.game import Layout
+
+
+def make_configs():
+    configurator = Configurator('grid')
+
+    configurator.fixed('algo.lr', 7e-4)
+    configurator.fixed('algo.gamma', 0.99)
+    # Keyword arguments of `game.Layout`; empty for the original 6x4 game.
+    configurator.fixed('env.layout', {})
+    configurator.fixed('agent.max_grad_norm', 0.5)
+    configurator.fixed('agent.entropy_coef', 0.01)
+    configurator.fixed('agent.value_coef', 0.5)
+
+    configurator.fixed('impala.actors', 4)
+    configurator.fixed('impala.envs_per_actor', 8)
+    # Steps per unroll; even, so that unrolls start on player 1's turn.
+    configurator.fixed('impala.unroll', 20)
+    # Unrolls per learner update.
+    configurator.fixed('impala.batch', 8)
+    configurator.fixed('impala.updates', 500)
+    configurator.fixed('impala.sync_interval', 1)
+    configurator.fixed('impala.rho_bar', 1.0)
+    configurator.fixed('impala.c_bar', 1.0)
+    # Seconds between checks that the actors are alive while waiting for
+    # unrolls.
+    configurator.fixed('impala.poll_interval', 1.0)
+
+    configurator.fixed('log.interval', 50)
+
+    return configurator.make_configs()
+
+
+def make_seeds():
+    return [0]
+
+
+def run_actor(actor_id, config, seed, shared_policy, version, lock, unrolls,
+              stop):
+    torch.set_num_threads(1)
+    # The trainer's event log, if any, has no writer thread in this process.
+    event_log.activate(None)
+    layout = Layout(**config['env.layout'])
+    num_envs = config['impala.envs_per_actor']
+    env_ids = range(actor_id * num_envs, (actor_id + 1) * num_envs)
+    envs = [CraftingEnv(seed + env_id, layout, env_id)
+            for env_id in env_ids]
+    policy = Policy(config, EnvSpec(envs[0]), torch.device('cpu'))
+    T = config['impala.unroll']
+    observations = np.stack([env.reset() for env in envs]).astype(np.float32)
+
+    policy_version = None
+    num_unrolls = 0
+    while not stop.is_set():
+        if num_unrolls % config['impala.sync_interval'] == 0:
+            with lock:
+                policy.load_state_dict(shared_policy.state_dict())
+                policy_version = version.value
+
+        unroll = {
+            'observations': np.zeros((T + 1,) + observations.shape,
+                                     dtype=np.float32),
+            'actions': np.zeros((T, num_envs), dtype=np.int64),
+            'logprobs': np.zeros((T, num_envs), dtype=np.float32),
+            'rewards': np.zeros((T, num_envs), dtype=np.float32),
+            'dones': np.zeros((T, num_envs), dtype=bool),
+            'version': policy_version,
+        }
+        for t in range(T):
+            unroll['observations'][t] = observations
+            out = policy.evaluate(torch.from_numpy(observations),
+                                  out_keys=['action', 'action_logprob'])
+            unroll['actions'][t] = out['action'].numpy()
+            unroll['logprobs'][t] = out['action_logprob'].numpy()
+            for i, env in enumerate(envs):
+                obs, reward, done, _ = env.step(int(unroll['actions'][t, i]))
+                unroll['rewards'][t, i] = 0.0 if reward is None else reward
+                unroll['dones'][t, i] = done
+                observations[i] = env.reset() if done else obs
+        unroll['observations'][T] = observations
+
+        while not stop.is_set():
+            try:
+                unrolls.put(unroll, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        num_unrolls += 1
+    # Don't wait for unrolls nobody will read before exiting.
+    unrolls.cancel_join_thread()
+
+
+def learner_step(policy, config, batch):
+    """One V-trace update on a list of unrolls."""
+    def stack(key):
+        return torch.from_numpy(np.concatenate([unroll[key] for unroll in batch],
+                                               axis=1))
+
+    observations = stack('observations')
+    actions = stack('actions')
+    behaviour_logprobs = stack('logprobs')
+    rewards = stack('rewards')
+    dones = stack('dones')
+    # Keep player 1's turns. An episode which ended on player 2's turn ends
+    # before player 1's next one, too.
+    T = actions.shape[0]
+    dones = dones[0::2] | dones[1::2]
+    observations = observations[0::2]
+    actions = actions[0::2]
+    behaviour_logprobs = behaviour_logprobs[0::2]
+    rewards = rewards[0::2]
+
+    features = policy.featurize(observations)
+    action_dist = policy.action_head(features[:-1])
+    logprobs = action_dist.log_prob(actions)
+    entropies = action_dist.entropy()
+    Vs = policy.V_head(features).squeeze(-1)
+
+    with torch.no_grad():
+        vs, pg_advantages = returns.vtrace(
+            rewards, dones, Vs[:-1], Vs[-1], logprobs - behaviour_logprobs,
+            config['algo.gamma'], config['impala.rho_bar'],
+            config['impala.c_bar'])
+
+    policy_loss = -(logprobs*pg_advantages).mean()
+    entropy_loss = -entropies.mean()
+    value_loss = F.mse_loss(Vs[:-1], vs)
+    loss = (policy_loss + config['agent.value_coef']*value_loss +
+            config['agent.entropy_coef']*entropy_loss)
+
+    policy.optimizer.zero_grad()
+    loss.backward()
+    nn.utils.clip_grad_norm_(policy.parameters(), config['agent.max_grad_norm'])
+    policy.optimizer_step(config)
+
+    return {'loss': loss.item(),
+            'policy_loss': policy_loss.item(),
+            'value_loss': value_loss.item(),
+            'policy_entropy': -entropy_loss.item(),
+            'frames': T * actions.shape[1]}
+
+
+def next_unroll(unrolls, actors, poll_interval):
+    """The next unroll, or a `RuntimeError` if an actor died, since the
+    learner would otherwise wait for its unrolls forever."""
+    while True:
+        try:
+            return unrolls.get(timeout=poll_interval)
+        except queue.Empty:
+            pass
+        dead = [actor for actor in actors if actor.exitcode is not None]
+        if dead:
+            raise RuntimeError(
+                'Actors ' + ', '.join(f'{actor.name} (exit code '
+                                      f'{actor.exitcode})' for actor in dead) +
+                ' exited during training.')
+
+
+def train(config, seed):
+    torch.manual_seed(seed)
+    layout = Layout(**config['env.layout'])
+    env_spec = EnvSpec(CraftingEnv(seed, layout))
+    device = torch.device('cpu')
+    policy = Policy(config, env_spec, device)
+    shared_policy = Policy(config, env_spec, device)
+    shared_policy.load_state_dict(policy.state_dict())
+    shared_policy.share_memory()
+
+    version = mp.Value('l', 0)
+    lock = mp.Lock()
+    unrolls = mp.Queue(maxsize=2 * config['impala.batch'])
+    stop = mp.Event()
+    actors = [mp.Process(target=run_actor, daemon=True,
+                         args=(actor_id, config, seed, shared_policy, version,
+                               lock, unrolls, stop))
+              for actor_id in range(config['impala.actors'])]
+    for actor in actors:
+        actor.start()
+
+    frames = 0
+    lags = []
+    start = time.perf_counter()
+    try:
+        for update in range(config['impala.updates']):
+            batch = [next_unroll(unrolls, actors,
+                                 config['impala.poll_interval'])
+                     for _ in range(config['impala.batch'])]
+            lags.extend(version.value - unroll['version'] for unroll in batch)
+            out = learner_step(policy, config, batch)
+            with lock:
+                shared_policy.load_state_dict(policy.state_dict())
+                version.value += 1
+            frames += out['frames']
+            if update % config['log.interval'] == 0:
+                elapsed = time.perf_counter() - start
+                print(f'Update {update}: loss {out["loss"]:.3f}, '
+                      f'entropy {out["policy_entropy"]:.3f}, '
+                      f'{frames / elapsed:.0f} frames/sec, '
+                      f'policy lag {np.mean(lags):.2f} (max {np.max(lags)})')
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        for actor in actors:
+            actor.join()
+    return {'frames_per_sec': frames / elapsed,
+            'mean_policy_lag': float(np.mean(lags)),
+            'max_policy_lag': int(np.max(lags))}
+
+
+if __name__ == '__main__':
+    for config in make_configs():
+        for seed in make_seeds():
+            print(train(config, seed))
@@ -1,175 +1,228 @@
+import sys
+sys.path.append('.')
+
 import re
 
+from dial_control_rl.dialogue_acts import DialogueAct, Intent
+
+
+# Patterns of the intents and slots `nlu` recognizes, in priority order.
+
+# (1st level) skip
+SKIP = re.compile("skip|don't move|do not move|hold position|stay|stop", re.I)
+
+# (1st level) go to any direction
+# filter out "alright", "yes, right"
+GO_DIRECTION = re.compile('(?:.*[^,s] )(right|left|up|down|top|bottom)', re.I)
+DIRECTION_WORD = re.compile('right|left|up|down|top|bottom', re.I)
+
+# (1st level) use item
+# only support "use *", "use the *"
+USE_ITEM = re.compile('(?:.*(?:use |use the ))(ruby|gold|amethyst|diamond|silver|jade|coal|pearl)', re.I)
+ITEM_WORD = re.compile('ruby|gold|amethyst|diamond|silver|jade|coal|pearl', re.I)
+
+# (2nd level) request item
+# need to deal with 2 cases: "I need/want *", "Can you *"
+REQUEST_ITEM = re.compile("(?:.*"
+                          "(?:(?:^| )i (?:[^\s]* ){0,2}(?:need|want) (?:[^\s]* ){0,2})"
+                          "|"
+                          "(?:(?:can|could) you (?:[^\s]* ){0,4})"
+                          ")(ruby|gold|amethyst|diamond|silver|jade|coal|pearl)", re.I)
+
+# (2nd level) offer item
+# need to deal with 2 cases: "Do you need/want *", "I can *"
+OFFER_ITEM = re.compile("(?:.*"
+                        "(?:you (?:[^\s]* ){0,2}(?:need|want) (?:[^\s]* ){0,2})"
+                        "|"
+                        "(?:i can (?:[^\s]* ){0,4})"
+                        ")(ruby|gold|amethyst|diamond|silver|jade|coal|pearl)", re.I)
+
+# (2nd level) accept offer
+# "it's/that's/this is/it'd be/it's really good/ok/alright"
+# "thanks/thank you/sure/no problem"
+# !!"no/nope/no thanks/no need"
+ACCEPT_OFFER = re.compile("(?:(?:s|be|really) (?:ok|alright|good)|thank|sure|no problem)", re.I)
+NO = re.compile("(^| )no(?! problem)", re.I)
+
+# (2nd level) decline offer
+# "no/no need/nope/don't/do not"
+DECLINE_OFFER = re.compile("(^| )no(?! problem)"
+                           "|n't"
+                           "|do not", re.I)
+
+# (3rd level) request goal
+# "what's your goal/what do you plan to do/what are you planning/what do you want"
+REQUEST_GOAL = re.compile("your goal"
+                          "|you (?:[^\s]* ){0,2}plan to (?:do|make|craft|build)"
+                          "|what (?:[^\s]* ){0,3}you (?:want|need)"
+                          "|re you (?:trying|planning|doing|making|crafting|building)", re.I)
+
+# (3rd level) give goal
+# If gem, metal, shape are all specified, it is GIVE_GOAL or CONFIRM_GOAL,
+# and neither REQUEST_ITEM nor OFFER_ITEM.
+GEM = re.compile("(ruby|amethyst|diamond|jade|coal|pearl)", re.I)
+METAL = re.compile("(gold|silver)", re.I)
+SHAPE = re.compile("(crown|bracelet|ring)", re.I)
+
+# (3rd level) confirm goal
+# if contains "you" and none of "can you/do you/are you" appears, it's CONFIRM_GOAL
+CONFIRM_GOAL = re.compile("(?!can |do |are )you ", re.I)
+
+# (3rd level) goal_confirmed
+GOAL_CONFIRMED = re.compile("(yeah|yes|right|exact|correct)", re.I)
+
+
+def _goal(input):
+    """The metal, gem and shape named in `input`, if all three are."""
+    gem = GEM.search(input)
+    if gem is None:
+        return None
+    metal = METAL.search(input)
+    if metal is None:
+        return None
+    shape = SHAPE.search(input)
+    if shape is None:
+        return None
+    return metal.group(1), gem.group(1), shape.group(1)
+
 
 def nlu(input):
+    """The `DialogueAct` of the highest priority intent in `input`.
+
+    Patterns are only tried until one matches, and the ones with leading
+    `.*` only if the words they end with appear at all.
+    """
     input = input.lower()
-    command = None
-    
-    # (1st level) skip
-    skip = re.search("skip|don't move|do not move|hold position|stay|stop", input, re.I)
-    
-    # (1st level) go to any direction
-    # filter out "alright", "yes, right"
-    go_direction = re.search('(?:.*[^,s] )(right|left|up|down|top|bottom)', input, re.I)
-    
-    # (1st level) use item
-    # only support "use *", "use the *"
-    use_item = re.search('(?:.*(?:use |use the ))(ruby|gold|amethyst|diamond|silver|jade|coal|pearl)', input, re.I)
-    
-    # (2nd level) request item
-    # need to deal with 2 cases: "I need/want *", "Can you *"
-    request_item = re.search("(?:.*"
-                              "(?:(?:^| )i (?:[^\s]* ){0,2}(?:need|want) (?:[^\s]* ){0,2})"
-                              "|"
-                              "(?:(?:can|could) you (?:[^\s]* ){0,4})"
-                             ")(ruby|gold|amethyst|diamond|silver|jade|coal|pearl)", input, re.I)
-    
-    # (2nd level) offer item
-    # need to deal with 2 cases: "Do you need/want *", "I can *"
-    offer_item = re.search("(?:.*"
-                            "(?:you (?:[^\s]* ){0,2}(?:need|want) (?:[^\s]* ){0,2})"
-                            "|"
-                            "(?:i can (?:[^\s]* ){0,4})"
-                           ")(ruby|gold|amethyst|diamond|silver|jade|coal|pearl)", input, re.I)
-    
-    # (2nd level) accept offer
-    # "it's/that's/this is/it'd be/it's really good/ok/alright" 
-    # "thanks/thank you/sure/no problem" 
-    # !!"no/nope/no thanks/no need"
-    accept_offer = re.search("(?:(?:s|be|really) (?:ok|alright|good)|thank|sure|no problem)", input, re.I)
-    if re.search("(^| )no(?! problem)", input, re.I):
-        accept_offer = None
-    
-    # (2nd level) decline offer
-    # "no/no need/nope/don't/do not"
-    decline_offer = re.search("(^| )no(?! problem)"
-                              "|n't"
-                              "|do not", input, re.I)
-    
-    # (3rd level) request goal
-    # "what's your goal/what do you plan to do/what are you planning/what do you want"
-    request_goal = re.search("your goal"
-                             "|you (?:[^\s]* ){0,2}plan to (?:do|make|craft|build)"
-                             "|what (?:[^\s]* ){0,3}you (?:want|need)"
-                             "|re you (?:trying|planning|doing|making|crafting|building)", input, re.I)
-    
-    # (3rd level) give goal
-    # "my goal is/I plan/I want/I need/I'm building" + "crown|bracelet|ring"
-    # If gem, metal, shape all specified, set REQUEST_ITEM and OFFER_ITEM to false
-    # give_goal = bool(re.search("my goal"
-                               # "|I (?:[^\s]* ){0,2}plan to (?:do|make|craft|build)"
-                               # "|I (?:[^\s]* ){0,2}(?:want|need)"
-                               # "|m (?:trying|planning|doing|making|crafting|building)", input, re.I)) \
-                # and bool(re.search("(?:crown|bracelet|ring)", input, re.I))
-    
-    # Actually, if gem, metal, shape are all specified, it is GIVE_GOAL or CONFIRM_GOAL
-    give_goal = None
-    gem = re.search("(ruby|amethyst|diamond|jade|coal|pearl)", input, re.I)
-    metal = re.search("(gold|silver)", input, re.I)
-    shape = re.search("(crown|bracelet|ring)", input, re.I)
-    if gem and metal and shape:
-        give_goal = True
-        request_item = None
-        offer_item = None
-    
-    # (3rd level) confirm goal
-    # if contains "you" and none of "can you/do you/are you" appears, it's CONFIRM_GOAL
-    confirm_goal = re.search("(?!can |do |are )you ", input, re.I)
-    if confirm_goal and gem and metal and shape:
-        confirm_goal = True
-        give_goal = None
-    
-    # (3rd level) goal_confirmed
-    goal_confirmed = re.search("(yeah|yes|right|exact|correct)", input, re.I)
-    
-    
-    if skip:
-        command = "skip()"
-    
-    elif go_direction:
-        direction = go_direction.groups()[0]
-        direction = "up" if direction == "top" else direction
-        direction = "down" if direction == "bottom" else direction
-        command = "go({0})".format(direction)
-    
-    elif use_item:
-        command = "use({0})".format(use_item.groups()[0])
-    
-    elif request_item:
-        command = "request({0})".format(request_item.groups()[0])
-    
-    elif offer_item:
-        command = "offer({0})".format(offer_item.groups()[0])
-    
-    elif accept_offer:
-        command = "accept_offer()"
-    
-    elif decline_offer:
-        command = "decline_offer()"
-    
-    elif request_goal:
-        command = "request_goal()"
-    
-    elif give_goal:
-        command = "give_goal({0},{1},{2})".format(metal.groups()[0], gem.groups()[0], shape.groups()[0])
-    
-    elif confirm_goal:
-        command = "confirm_goal({0},{1},{2})".format(metal.groups()[0], gem.groups()[0], shape.groups()[0])
-    
-    elif goal_confirmed:
-        command = "goal_confirmed()"
-    
-    else:
-        command = "invalid_input()"
-    
-    return command
 
+    if SKIP.search(input):
+        return DialogueAct(Intent.SKIP)
 
+    if DIRECTION_WORD.search(input):
+        go_direction = GO_DIRECTION.search(input)
+        if go_direction:
+            direction = go_direction.group(1)
+            direction = "up" if direction == "top" else direction
+            direction = "down" if direction == "bottom" else direction
+            return DialogueAct(Intent.GO, direction=direction)
 
-def nlg(command):
-    command, params = re.split('[()]', command)[:2]
-    if command == "accept_action":
-        return("OK.")
-    
-    elif command == "decline_action":
-        return("Sorry I can not do that!")
-    
-    elif command == "request_item":
-        return("Can you bring {0} for me?".format(params))
-    
-    elif command == "offer_item":
-        return("I can bring {0} for you.".format(params))
-    
-    elif command == "accept_request":
-        return("OK, I can do that.")
-    
-    elif command == "decline_request":
-        return("Sorry, I can not do that!")
-    
-    elif command == "accept_offer":
-        return("That's good!")
-    
-    elif command == "decline_offer":
-        return("No thanks.")
-    
-    elif command == "request_goal":
-        return("Can you tell me what's your goal?")
-    
-    elif command == "give_goal":
-        params = params.split(',')
-        return("I want to make a {0} {1} with {2}.".format(params[0], params[2], params[1]))
-    
-    elif command == "confirm_goal":
-        params = params.split(',')
-        return("You want to make a {0} {1} with {2}. Is that correct?".format(params[0], params[2], params[1]))
-    
-    elif command == "goal_confirmed":
-        return("Yes, that's right.")
-        
-    else:
-        # not implemented
-        assert False
-        
+    # Every goal names a gem, so there is none without an item word.
+    goal = None
+    if ITEM_WORD.search(input):
+        use_item = USE_ITEM.search(input)
+        if use_item:
+            return DialogueAct(Intent.USE, item=use_item.group(1))
+        goal = _goal(input)
+        if goal is None:
+            request_item = REQUEST_ITEM.search(input)
+            if request_item:
+                return DialogueAct(Intent.REQUEST,
+                                   item=request_item.group(1))
+            offer_item = OFFER_ITEM.search(input)
+            if offer_item:
+                return DialogueAct(Intent.OFFER, item=offer_item.group(1))
+
+    if ACCEPT_OFFER.search(input) and not NO.search(input):
+        return DialogueAct(Intent.ACCEPT_OFFER)
+
+    if DECLINE_OFFER.search(input):
+        return DialogueAct(Intent.DECLINE_OFFER)
+
+    if REQUEST_GOAL.search(input):
+        return DialogueAct(Intent.REQUEST_GOAL)
+
+    if goal is not None:
+        metal, gem, shape = goal
+        intent = (Intent.CONFIRM_GOAL if CONFIRM_GOAL.search(input)
+                  else Intent.GIVE_GOAL)
+        return DialogueAct(intent, metal=metal, gem=gem, shape=shape)
+
+    if GOAL_CONFIRMED.search(input):
+        return DialogueAct(Intent.GOAL_CONFIRMED)
+
+    return DialogueAct(Intent.INVALID_INPUT)
+
+
+def nlu_batch(inputs):
+    """`nlu` of each of `inputs`; repeated utterances are parsed once."""
+    acts = {}
+    return [acts[input] if input in acts else acts.setdefault(input, nlu(input))
+            for input in inputs]
+
+
+# Templates of the utterances of each act that `nlg` generates. The first is
+# the canonical one; the others are paraphrases.
+TEMPLATES = {
+    Intent.ACCEPT_ACTION: ["OK.", "Sure.", "Alright."],
+    Intent.DECLINE_ACTION: ["Sorry I can not do that!",
+                            "I can't do that, sorry."],
+    Intent.REQUEST_ITEM: ["Can you bring {item} for me?",
+                          "Could you get me {item}?",
+                          "I need {item}, can you bring it?"],
+    Intent.OFFER_ITEM: ["I can bring {item} for you.",
+                        "Do you want me to get {item}?"],
+    Intent.ACCEPT_REQUEST: ["OK, I can do that.", "Sure, I'll do that."],
+    Intent.DECLINE_REQUEST: ["Sorry, I can not do that!",
+                             "Sorry, I can't help with that."],
+    Intent.ACCEPT_OFFER: ["That's good!", "Thanks, that would be great."],
+    Intent.DECLINE_OFFER: ["No thanks.", "No need, thanks."],
+    Intent.REQUEST_GOAL: ["Can you tell me what's your goal?",
+                          "What are you trying to make?"],
+    Intent.GIVE_GOAL: ["I want to make a {metal} {shape} with {gem}.",
+                       "My goal is a {metal} {shape} with {gem}."],
+    Intent.CONFIRM_GOAL: ["You want to make a {metal} {shape} with {gem}. "
+                          "Is that correct?",
+                          "So you want a {metal} {shape} with {gem}?"],
+    Intent.GOAL_CONFIRMED: ["Yes, that's right.", "Yes, exactly."],
+}
+
+
+def _render(act):
+    return tuple(template.format(**act._asdict())
+                 for template in TEMPLATES[act.intent])
+
+
+# The utterances of every act with known slot values, by act and by command.
+NLG_TABLE = {act: _render(act) for intent in TEMPLATES
+             for act in DialogueAct.all(intent)}
+COMMAND_TABLE = {str(act): utterances
+                 for act, utterances in NLG_TABLE.items()}
+
+
+def _utterances(act):
+    utterances = (COMMAND_TABLE.get(act) if isinstance(act, str)
+                  else NLG_TABLE.get(act))
+    if utterances is None:
+        # Slot values outside the table are rendered as they come.
+        if isinstance(act, str):
+            act = DialogueAct.parse(act)
+        if act.intent not in TEMPLATES:
+            raise ValueError(f'No utterance for {act}.')
+        utterances = _render(act)
+    return utterances
+
+
+def nlg(act, random_state=None):
+    """The utterance of a `DialogueAct`, or of its command string. Raises a
+    `ValueError` for acts `nlg` has no utterance for and malformed commands.
+
+    With a `numpy.random.RandomState`, one of the act's paraphrases is
+    picked at random instead of the canonical utterance, with the same draw
+    as `nlg_batch`, so both pick the same paraphrases from the same state.
+    """
+    utterances = _utterances(act)
+    if random_state is None:
+        return utterances[0]
+    return utterances[int(random_state.random_sample() * len(utterances))]
+
+
+def nlg_batch(acts, random_state=None):
+    """`nlg` of each of `acts`."""
+    if random_state is None:
+        return [_utterances(act)[0] for act in acts]
+    choices = random_state.random_sample(len(acts))
+    utterances = [_utterances(act) for act in acts]
+    return [variants[int(choice * len(variants))]
+            for variants, choice in zip(utterances, choices)]
 
 
 if __name__=="__main__":
@@ -0,0 +1,98 @@
+"""An LRU cache of a policy's outputs, keyed by observation bytes.
+
+Crafting observations are small and recur across evaluation episodes and
+interactive sessions, so `PolicyCache` remembers the outputs of the policy's
+`evaluate`, e.g. `Policy.evaluate`, for the most recent `maxsize` distinct
+observations and only evaluates the misses of each batch, in one forward
+pass. Caching a `scripted_policy.ScriptedPolicy`, which standardizes raw
+observations itself, keys the cache on the raw uint8 observations, which
+are small and do not change with the running statistics. The cache is cleared whenever a
+parameter of the policy is replaced or changed in place, e.g. by
+`load_state_dict` or an optimizer step.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+class PolicyCache:
+
+    def __init__(self, policy, out_keys=('V', 'probs'), maxsize=1 << 16):
+        # Sampled outputs must not be replayed.
+        assert not {'action', 'action_logprob'} & set(out_keys)
+        self.policy = policy
+        self.out_keys = tuple(out_keys)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._params_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def stats(self):
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate, 'evictions': self.evictions,
+                'invalidations': self.invalidations}
+
+    def clear(self):
+        self._entries.clear()
+
+    def _check_params(self):
+        version = tuple((id(p), p._version) for p in self.policy.parameters())
+        if version != self._params_version:
+            if self._params_version is not None and self._entries:
+                self.invalidations += 1
+            self.clear()
+            self._params_version = version
+
+    def __call__(self, x):
+        """`out_keys` of the policy's outputs for a batch `x` of
+        observations, stacked in the same order, or for a single one."""
+        single = np.ndim(x) == 1
+        x = np.ascontiguousarray(np.atleast_2d(x))
+        self._check_params()
+        keys = [row.tobytes() for row in x]
+        rows = [None] * len(keys)
+        missing = {}
+        for i, key in enumerate(keys):
+            entry = self._entries.get(key)
+            if entry is None:
+                # Repeats within the batch are evaluated once, and count as
+                # hits.
+                if key in missing:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                missing.setdefault(key, []).append(i)
+            else:
+                self._entries.move_to_end(key)
+                rows[i] = entry
+                self.hits += 1
+
+        if missing:
+            first = [indices[0] for indices in missing.values()]
+            obs = torch.from_numpy(x[first]).to(self.policy.device)
+            out = self.policy.evaluate(obs, out_keys=self.out_keys)
+            for j, (key, indices) in enumerate(missing.items()):
+                entry = tuple(out[k][j].clone() for k in self.out_keys)
+                for i in indices:
+                    rows[i] = entry
+                self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        if single:
+            return dict(zip(self.out_keys, rows[0]))
+        return {k: torch.stack([row[n] for row in rows])
+                for n, k in enumerate(self.out_keys)}
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Serves policy queries from many sessions with batched forward passes.
+
+Sessions call `PolicyServer.query` (or `submit`) from their own threads. A
+server thread waits for the first pending query, collects more until
+`max_batch` are pending or `max_latency` seconds have passed since the
+first, and answers all of them with one forward pass of a scripted
+`StandardizedPolicy`. Run this module to compare the latency and throughput
+of a number of concurrent sessions for several latency windows.
+"""
+
+import sys
+sys.path.append('.')
+
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+
+from dial_control_rl import scripted_policy
+
+
+class PolicyServer:
+    """Answers queries with the value and action probabilities of `module`,
+    a `StandardizedPolicy`, by default the exported one."""
+
+    def __init__(self, module=None, max_batch=64, max_latency=0.002):
+        self.module = (scripted_policy.load(scripted_policy.EXPORT_PATH)
+                       if module is None else module)
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.num_batches = 0
+        self.num_queries = 0
+        self._pending = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._run, name='PolicyServer',
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def mean_batch_size(self):
+        return self.num_queries / max(self.num_batches, 1)
+
+    def submit(self, obs):
+        """Queues a raw observation and returns a `Future` of its value and
+        action probabilities."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The policy server is closed.')
+            self._pending.append((np.asarray(obs, dtype=np.float32), future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._changed.notify_all()
+        return future
+
+    def query(self, obs):
+        return self.submit(obs).result()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if not self._pending:
+                    return
+                # Wait out the window, unless the batch fills up first.
+                deadline = time.perf_counter() + self.max_latency
+                while (len(self._pending) < self.max_batch and
+                       not self._closed):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._answer(batch)
+
+    def _answer(self, batch):
+        try:
+            obs = torch.from_numpy(np.stack([obs for obs, _ in batch]))
+            with torch.inference_mode():
+                Vs, probs = self.module(obs)
+            Vs, probs = Vs.numpy(), probs.numpy()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for i, (_, future) in enumerate(batch):
+            future.set_result((float(Vs[i]), probs[i]))
+        self.num_batches += 1
+        self.num_queries += len(batch)
+
+
+def benchmark(path=scripted_policy.EXPORT_PATH, num_sessions=64,
+              queries_per_session=200, windows=(0.0, 0.0005, 0.001, 0.002,
+                                                0.005)):
+    torch.set_num_threads(1)
+    module = scripted_policy.load(path)
+    obs_dim = module.obs_mean.shape[0]
+    observations = np.random.RandomState(0).randint(
+        0, 2, (num_sessions, obs_dim)).astype(np.uint8)
+
+    def run_sessions(query):
+        latencies = [[] for _ in range(num_sessions)]
+
+        def session(i):
+            for _ in range(queries_per_session):
+                start = time.perf_counter()
+                query(observations[i])
+                latencies[i].append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=session, args=(i,))
+                   for i in range(num_sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        latencies = np.concatenate(latencies) * 1e3
+        return (f'p50 {np.percentile(latencies, 50):.2f} ms, '
+                f'p99 {np.percentile(latencies, 99):.2f} ms, '
+                f'{len(latencies) / elapsed:.0f} queries/sec')
+
+    # One forward pass per query, serialized as they would be on one policy.
+    lock = threading.Lock()
+
+    def unbatched_query(obs):
+        obs = torch.from_numpy(obs.astype(np.float32)).unsqueeze(0)
+        with lock, torch.inference_mode():
+            return module(obs)
+
+    print(f'{num_sessions} sessions, unbatched: {run_sessions(unbatched_query)}')
+    for window in windows:
+        with PolicyServer(module, max_batch=num_sessions,
+                          max_latency=window) as server:
+            result = run_sessions(server.query)
+        print(f'{num_sessions} sessions, {window * 1e3:.1f} ms window: '
+              f'{result}, mean batch {server.mean_batch_size:.1f}')
+
+
+if __name__ == '__main__':
+    benchmark(*sys.argv[1:])
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Bootstrapped returns and generalized advantage estimates of T x N rollouts.
+
+These are reverse scans over time in torch, vectorized over the N envs, and
+compute the same values as lagom's `bootstrapped_returns_from_segment` and
+`gae_from_segment` without leaving torch. `vtrace` corrects returns for
+off-policy rollouts. The `scripted_*` functions are TorchScript versions of
+the same functions. Run this module to check them against lagom and compare
+their speed.
+"""
+
+import sys
+sys.path.append('.')
+
+import time
+
+import numpy as np
+import torch
+from lagom.envs import EnvSpec
+from lagom.envs.vec_env import VecStandardize
+from lagom.history.batch_segment import BatchSegment
+from lagom.history.metrics import bootstrapped_returns_from_segment
+from lagom.history.metrics import gae_from_segment
+
+from dial_control_rl.env import BatchedCraftingEnv
+
+
+def bootstrapped_returns(rewards, dones, last_V, gamma: float):
+    """Discounted returns of (T, N) `rewards`, bootstrapped from `last_V`,
+    the (N,) values of the states after the last step. Returns stop at
+    steps whose `dones` are set."""
+    discounts = gamma * (1.0 - dones.float())
+    Qs = torch.empty_like(rewards)
+    Q = last_V
+    for t in range(rewards.shape[0] - 1, -1, -1):
+        Q = torch.addcmul(rewards[t], discounts[t], Q, out=Qs[t])
+    return Qs
+
+
+def gae(rewards, dones, values, last_V, gamma: float, lam: float):
+    """Generalized advantage estimates of (T, N) `rewards` given the (T, N)
+    `values` of the states they were received in and the (N,) values
+    `last_V` of the states after the last step."""
+    discounts = gamma * (1.0 - dones.float())
+    next_values = torch.cat([values[1:], last_V.unsqueeze(0)])
+    deltas = rewards + discounts * next_values - values
+    discounts = discounts * lam
+    As = torch.empty_like(rewards)
+    A = torch.zeros_like(last_V)
+    for t in range(rewards.shape[0] - 1, -1, -1):
+        A = torch.addcmul(deltas[t], discounts[t], A, out=As[t])
+    return As
+
+
+def vtrace(rewards, dones, values, last_V, log_rhos, gamma: float,
+           rho_bar: float = 1.0, c_bar: float = 1.0, lam: float = 1.0):
+    """V-trace value targets and policy-gradient advantages (Espeholt et
+    al., 2018) of (T, N) `rewards` collected by a behaviour policy, where
+    `log_rhos` are the log importance ratios of the target policy to it.
+
+    With `log_rhos` zero, the targets are `values` plus `gae` of them.
+    """
+    rhos = torch.exp(log_rhos)
+    clipped_rhos = torch.clamp(rhos, max=rho_bar)
+    discounts = gamma * (1.0 - dones.float())
+    next_values = torch.cat([values[1:], last_V.unsqueeze(0)])
+    deltas = clipped_rhos * (rewards + discounts * next_values - values)
+    coefs = discounts * lam * torch.clamp(rhos, max=c_bar)
+    corrections = torch.empty_like(rewards)
+    correction = torch.zeros_like(last_V)
+    for t in range(rewards.shape[0] - 1, -1, -1):
+        correction = torch.addcmul(deltas[t], coefs[t], correction,
+                                   out=corrections[t])
+    vs = values + corrections
+    next_vs = torch.cat([vs[1:], last_V.unsqueeze(0)])
+    pg_advantages = clipped_rhos * (rewards + discounts * next_vs - values)
+    return vs, pg_advantages
+
+
+_scripted = {}
+
+
+def _script(f):
+    if f not in _scripted:
+        _scripted[f] = torch.jit.script(f)
+    return _scripted[f]
+
+
+def scripted_bootstrapped_returns(rewards, dones, last_V, gamma):
+    return _script(bootstrapped_returns)(rewards, dones, last_V, gamma)
+
+
+def scripted_gae(rewards, dones, values, last_V, gamma, lam):
+    return _script(gae)(rewards, dones, values, last_V, gamma, lam)
+
+
+def scripted_vtrace(rewards, dones, values, last_V, log_rhos, gamma,
+                    rho_bar=1.0, c_bar=1.0, lam=1.0):
+    return _script(vtrace)(rewards, dones, values, last_V, log_rhos, gamma,
+                           rho_bar, c_bar, lam)
+
+
+def _random_segment(T, N, random_state):
+    D = BatchSegment(EnvSpec(VecStandardize(BatchedCraftingEnv(range(N)))), T)
+    for t in range(T):
+        D.add_reward(t, random_state.randn(N))
+        D.add_done(t, random_state.rand(N) < 0.05)
+    values = random_state.randn(N, T).astype(np.float32)
+    last_V = random_state.randn(N).astype(np.float32)
+    return D, values, last_V
+
+
+def validate(T=100, N=20, gamma=0.99, lam=0.97, seed=0):
+    """Checks all versions against lagom on a random segment."""
+    D, values, last_V = _random_segment(T, N, np.random.RandomState(seed))
+    expected_Qs = bootstrapped_returns_from_segment(
+        D, torch.from_numpy(last_V), gamma)
+    expected_As = gae_from_segment(D, torch.from_numpy(values),
+                                   torch.from_numpy(last_V), gamma, lam)
+    rewards = torch.from_numpy(D.numpy_rewards.T)
+    dones = torch.from_numpy(D.numpy_dones.T)
+    for returns_fn, gae_fn in ((bootstrapped_returns, gae),
+                               (scripted_bootstrapped_returns, scripted_gae)):
+        Qs = returns_fn(rewards, dones, torch.from_numpy(last_V), gamma)
+        As = gae_fn(rewards, dones, torch.from_numpy(values.T),
+                    torch.from_numpy(last_V), gamma, lam)
+        assert np.allclose(Qs.t().numpy(), expected_Qs, atol=1e-4)
+        assert np.allclose(As.t().numpy(), expected_As, atol=1e-4)
+    for vtrace_fn in (vtrace, scripted_vtrace):
+        vs, _ = vtrace_fn(rewards, dones, torch.from_numpy(values.T),
+                          torch.from_numpy(last_V), torch.zeros_like(rewards),
+                          gamma, lam=lam)
+        assert np.allclose((vs.t() - torch.from_numpy(values)).numpy(),
+                           expected_As, atol=1e-4)
+
+
+def benchmark(Ts=(10, 100, 1000), N=20, repeats=10, gamma=0.99, lam=0.97):
+    def time_per_call(f):
+        f()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            f()
+        return (time.perf_counter() - start) / repeats * 1e3
+
+    for T in Ts:
+        D, values, last_V = _random_segment(T, N, np.random.RandomState(0))
+        rewards = torch.from_numpy(D.numpy_rewards.T)
+        dones = torch.from_numpy(D.numpy_dones.T)
+        values_t = torch.from_numpy(values)
+        last_V_t = torch.from_numpy(last_V)
+
+        def lagom_path():
+            Qs = bootstrapped_returns_from_segment(D, last_V_t, gamma)
+            As = gae_from_segment(D, values_t, last_V_t, gamma, lam)
+            return (torch.from_numpy(Qs.copy()).float(),
+                    torch.from_numpy(As.copy()).float())
+
+        def torch_path(returns_fn=bootstrapped_returns, gae_fn=gae):
+            return (returns_fn(rewards, dones, last_V_t, gamma),
+                    gae_fn(rewards, dones, values_t.t(), last_V_t, gamma,
+                           lam))
+
+        def scripted_path():
+            return torch_path(scripted_bootstrapped_returns, scripted_gae)
+
+        print(f'T={T}, N={N}: '
+              f'lagom {time_per_call(lagom_path):.2f} ms, '
+              f'torch {time_per_call(torch_path):.2f} ms, '
+              f'scripted {time_per_call(scripted_path):.2f} ms')
+
+
+if __name__ == '__main__':
+    validate()
+    print('Returns and advantages match lagom.')
+    benchmark()
@@ -6,10 +6,18 @@ sys.path.append('.')
 import numpy as np
 import torch
 import pickle
+from pathlib import Path
 
-params = torch.load('logs-3/0/1013845395/trained_params')
+from dial_control_rl import agent, checkpoint, scripted_policy
+from dial_control_rl.policy_cache import PolicyCache
+
+LOG_DIR = Path('logs-3/0/1013845395')
+if (LOG_DIR / checkpoint.FILENAME).exists():
+    saved = checkpoint.load(LOG_DIR / checkpoint.FILENAME)
+else:
+    # Runs from before checkpoints only saved the policy's weights.
+    saved = {'policy': torch.load(LOG_DIR / 'trained_params')}
 
-from dial_control_rl import agent
 from dial_control_rl.env import CraftingEnv
 
 from lagom.utils import Seeder
@@ -25,25 +33,45 @@ seeds = seeder(size=1)
 env_constructors = []
 for seed in seeds:
     env_constructors.append(partial(CraftingEnv, seed))
-env = VecStandardize(SerialVecEnv(env_constructors),
-                        clip_reward=100.0)
+venv = SerialVecEnv(env_constructors)
+env = VecStandardize(venv, clip_reward=100.0)
 env_spec = EnvSpec(env)
 
 policy = agent.Policy({'algo.rl': 0}, env_spec, torch.device('cpu'))
-policy.load_state_dict(params)
-policy = policy.double()
+policy.load_state_dict(saved['policy'])
+
+# Standardize raw observations with frozen statistics: those the policy was
+# trained with if they were saved, or else those of `env` after one reset.
+if 'obs_mean' in saved:
+    statistics = (saved['obs_mean'], saved['obs_std'], saved['clip_obs'],
+                  saved['eps'])
+else:
+    env.reset()
+    statistics = (np.array(env.obs_runningavg.mu, dtype=np.float32),
+                  np.array(env.obs_runningavg.sigma, dtype=np.float32),
+                  env.clip_obs, env.eps)
+scripted = scripted_policy.ScriptedPolicy(
+    module=scripted_policy.standardized(policy, *statistics))
+# Keyed on the raw observations' bytes, which recur across queries.
+cache = PolicyCache(scripted)
 
 def V(x):
-    out = policy(torch.tensor(x), ['V'])
-    return out['V'][0]
+    """The value of a raw observation."""
+    return float(cache(np.atleast_2d(x))['V'][0])
 
 def Q(x):
-    out = policy(torch.tensor(x), ['action_dist'])
-    out = out['action_dist']
-    return out.probs.detach().numpy()
+    """The action probabilities of raw observations."""
+    return cache(np.atleast_2d(x))['probs'].numpy()
+
+def export(path=scripted_policy.EXPORT_PATH):
+    """Saves the policy, with the statistics `V` and `Q` standardize with, as
+    a TorchScript module that `scripted_policy.ScriptedPolicy` can serve."""
+    return scripted_policy.export(policy, path, *statistics)
 
 if __name__ == '__main__':
-    obs = env.reset()
+    obs = venv.reset()
     print(V(obs))
     print(Q(obs))
-
+    print(cache.stats())
+    export()
+    print(f'Exported to {scripted_policy.EXPORT_PATH}.')
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Runs (config, seed) training jobs on the cores of one machine.
+
+Each worker process gets `threads_per_job` cores of its own, by default an
+equal share of the available cores (`cores_per_job`). It pins itself
+and torch's thread pools to them, then repeatedly takes the next job from a
+shared queue, so a worker that finishes early picks up the work others have
+not started. A record of every job, with its wall time and throughput, is
+appended to `jobs.jsonl` as it finishes.
+"""
+
+import sys
+sys.path.append('.')
+
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+from pathlib import Path
+
+import torch
+
+
+def _available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cores_per_job(num_jobs):
+    """The number of cores each of `num_jobs` concurrent jobs gets when the
+    available cores are shared equally among them."""
+    return max(1, len(_available_cores()) // max(num_jobs, 1))
+
+
+def _cores(worker_id, threads_per_job):
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    available = _available_cores()
+    start = worker_id * threads_per_job % len(available)
+    return set(available[start:start + threads_per_job])
+
+
+def _worker(worker_id, algorithm, threads_per_job, jobs, records):
+    cores = _cores(worker_id, threads_per_job)
+    if cores:
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads_per_job)
+    torch.set_num_interop_threads(1)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        index, config, seed = job
+        device = torch.device('cuda' if config.get('cuda') else 'cpu')
+        record = {'job': index, 'ID': config.get('ID'), 'seed': seed,
+                  'worker': worker_id, 'cores': sorted(cores or [])}
+        start = time.perf_counter()
+        try:
+            result = algorithm(config, seed, device) or {}
+            record['status'] = 'done'
+            record.update(result)
+        except Exception:
+            record['status'] = 'failed'
+            record['error'] = traceback.format_exc()
+        record['wall_time'] = time.perf_counter() - start
+        if 'timesteps' in record:
+            record['timesteps_per_sec'] = (record['timesteps'] /
+                                           record['wall_time'])
+        records.put(record)
+
+
+def _next_record(records, workers, poll_interval=1.0):
+    """The next record, or a `RuntimeError` if a worker died without writing
+    its job's record, e.g. when it was killed for running out of memory."""
+    while True:
+        try:
+            return records.get(timeout=poll_interval)
+        except queue.Empty:
+            pass
+        dead = [worker for worker in workers
+                if worker.exitcode not in (None, 0)]
+        if not dead and any(worker.is_alive() for worker in workers):
+            continue
+        # A record put just before its worker exited may still be in flight.
+        try:
+            return records.get(timeout=poll_interval)
+        except queue.Empty:
+            pass
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        raise RuntimeError(
+            'Job workers ' + ', '.join(
+                f'{worker.name} (exit code {worker.exitcode})'
+                for worker in dead or workers) +
+            ' exited before every job finished.')
+
+
+def run_jobs(algorithm, jobs, log_dir, threads_per_job=None,
+             num_workers=None):
+    """Runs `algorithm(config, seed, device)` for every (config, seed) in
+    `jobs` and returns their records in job order.
+
+    `threads_per_job` defaults to `cores_per_job(len(jobs))`. `num_workers`
+    defaults to as many as fit on the available cores, and never more than
+    there are jobs. Jobs that raise are recorded as failed; a worker that
+    dies outright stops the run with a `RuntimeError`.
+    """
+    jobs = list(jobs)
+    if threads_per_job is None:
+        threads_per_job = cores_per_job(len(jobs))
+    if num_workers is None:
+        num_workers = max(1, len(_available_cores()) // threads_per_job)
+    num_workers = min(num_workers, len(jobs))
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    job_queue = mp.Queue()
+    for index, (config, seed) in enumerate(jobs):
+        job_queue.put((index, config, seed))
+    for _ in range(num_workers):
+        job_queue.put(None)
+    records = mp.Queue()
+    workers = [mp.Process(target=_worker,
+                          args=(worker_id, algorithm, threads_per_job,
+                                job_queue, records))
+               for worker_id in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    results = [None] * len(jobs)
+    with open(log_dir / 'jobs.jsonl', 'a') as f:
+        for _ in jobs:
+            record = _next_record(records, workers)
+            results[record['job']] = record
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            print(f'Job {record["job"]} (ID {record["ID"]}, seed '
+                  f'{record["seed"]}) {record["status"]} in '
+                  f'{record["wall_time"]:.0f} s.')
+    for worker in workers:
+        worker.join()
+    return results
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""A trained `Policy` as one self-contained TorchScript module.
+
+`export` packages the featurizer, the action and value heads and the
+`VecStandardize` observation statistics into a `StandardizedPolicy` and saves
+it with TorchScript. `load` only needs torch, so the saved policy can be
+served without lagom or pycolab; `ScriptedPolicy` answers V and Q queries on
+raw observations, as `rl_policy` does. Run this module to time single
+observation queries of a saved policy.
+"""
+
+import sys
+sys.path.append('.')
+
+import copy
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+EXPORT_PATH = 'logs-3/0/1013845395/policy.pt'
+
+
+class StandardizedPolicy(nn.Module):
+    """Standardizes and clips raw observations as `VecStandardize` does, then
+    evaluates the policy's value and action probabilities on them."""
+
+    def __init__(self, featurize, action_layer, value_layer, obs_mean, obs_std,
+                 clip_obs: float = 10.0, eps: float = 1e-8):
+        super().__init__()
+        self.featurize = featurize
+        self.action_layer = action_layer
+        self.value_layer = value_layer
+        self.register_buffer('obs_mean', torch.as_tensor(obs_mean,
+                                                         dtype=torch.float32))
+        self.register_buffer('obs_std', torch.as_tensor(obs_std,
+                                                        dtype=torch.float32))
+        self.clip_obs = clip_obs
+        self.eps = eps
+
+    def features(self, obs):
+        obs = (obs.float() - self.obs_mean) / (self.obs_std + self.eps)
+        return self.featurize(torch.clamp(obs, -self.clip_obs, self.clip_obs))
+
+    def forward(self, obs):
+        """The values, of shape (N,), and action probabilities, of shape
+        (N, num_actions), of (N, obs_dim) observations."""
+        features = self.features(obs)
+        return (self.value_layer(features).squeeze(-1),
+                F.softmax(self.action_layer(features), dim=-1))
+
+    @torch.jit.export
+    def V(self, obs):
+        return self.value_layer(self.features(obs)).squeeze(-1)
+
+    @torch.jit.export
+    def Q(self, obs):
+        return F.softmax(self.action_layer(self.features(obs)), dim=-1)
+
+
+def standardized(policy, obs_mean, obs_std, clip_obs=10.0, eps=1e-8):
+    """A `StandardizedPolicy` of a copy of `policy` with the given
+    observation statistics, on the CPU."""
+    module = StandardizedPolicy(copy.deepcopy(policy.featurize),
+                                copy.deepcopy(policy.action_head.action_head),
+                                copy.deepcopy(policy.V_head.value_head),
+                                obs_mean, obs_std, clip_obs, eps)
+    return module.cpu().float().eval()
+
+
+def export(policy, path, obs_mean, obs_std, clip_obs=10.0, eps=1e-8):
+    """Scripts `policy` with the given observation statistics and saves it to
+    `path`. Returns the scripted module."""
+    module = torch.jit.script(standardized(policy, obs_mean, obs_std,
+                                           clip_obs, eps))
+    torch.jit.save(module, str(path))
+    return module
+
+
+def load(path):
+    return torch.jit.load(str(path), map_location='cpu').eval()
+
+
+class ScriptedPolicy:
+    """V and Q queries on single raw observations, or batches of them, of the
+    policy saved at `path`, or of a `StandardizedPolicy` `module`.
+
+    `evaluate` answers batches as `Policy.evaluate` does, so that a
+    `PolicyCache` can key the answers on raw observations.
+    """
+
+    device = torch.device('cpu')
+
+    def __init__(self, path=EXPORT_PATH, module=None):
+        self.module = load(path) if module is None else module
+
+    def parameters(self):
+        return self.module.parameters()
+
+    def evaluate(self, obs, out_keys=('V', 'probs')):
+        """The 'V' and 'probs' of a batch of raw observations."""
+        with torch.inference_mode():
+            Vs, probs = self.module(obs)
+        out = {'V': Vs.unsqueeze(-1), 'probs': probs}
+        return {k: out[k] for k in out_keys}
+
+    def _batch(self, x):
+        obs = torch.from_numpy(np.asarray(x, dtype=np.float32))
+        return obs.unsqueeze(0) if obs.dim() == 1 else obs
+
+    def V(self, x):
+        with torch.inference_mode():
+            return self.module.V(self._batch(x)).numpy()
+
+    def Q(self, x):
+        with torch.inference_mode():
+            return self.module.Q(self._batch(x)).numpy()
+
+
+def benchmark(path=EXPORT_PATH, repeats=10000):
+    torch.set_num_threads(1)
+    policy = ScriptedPolicy(path)
+    obs_dim = policy.module.obs_mean.shape[0]
+    obs = np.random.RandomState(0).randint(0, 2, obs_dim).astype(np.uint8)
+    for name, query in (('V', policy.V), ('Q', policy.Q)):
+        for _ in range(100):
+            query(obs)
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            query(obs)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1e6
+        print(f'{name}: p50 {np.percentile(latencies, 50):.1f} us, '
+              f'p99 {np.percentile(latencies, 99):.1f} us')
+
+
+if __name__ == '__main__':
+    benchmark(*sys.argv[1:])
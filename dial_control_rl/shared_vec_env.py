@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Vectorized env which steps shards of envs in worker processes.
+
+Observations, rewards and dones are written by the workers into NumPy arrays
+backed by shared memory, so only actions' readiness and the (small) infos
+cross process boundaries. Run this module to compare its throughput with
+`SerialVecEnv` for 1, 2, 4 and 8 workers.
+"""
+
+import sys
+sys.path.append('.')
+
+import multiprocessing as mp
+import time
+from functools import partial
+
+import numpy as np
+
+from dial_control_rl import event_log
+
+
+def _shared_array(shape, dtype):
+    dtype = np.dtype(dtype)
+    raw = mp.RawArray('b', max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return raw, shape, dtype
+
+
+def _as_array(shared):
+    raw, shape, dtype = shared
+    return np.frombuffer(raw, dtype=dtype,
+                         count=int(np.prod(shape))).reshape(shape)
+
+
+def _worker(conn, list_make_env, start, shared, events_path, events_append):
+    # A forked worker inherits the trainer's event log, but not its writer
+    # thread, so it logs to a file of its own.
+    events = None
+    if events_path is not None:
+        events = event_log.EventLog(events_path, append=events_append)
+    event_log.activate(events)
+    envs = [make_env() for make_env in list_make_env]
+    stop = start + len(envs)
+    actions, observations, init_observations, rewards, dones = [
+        _as_array(s)[start:stop] for s in shared]
+    try:
+        while True:
+            command, data = conn.recv()
+            if command == 'step':
+                infos = []
+                for i, env in enumerate(envs):
+                    observation, reward, done, info = env.step(actions[i])
+                    observations[i] = observation
+                    rewards[i] = 0.0 if reward is None else reward
+                    dones[i] = done
+                    if done:
+                        init_observations[i] = env.reset()
+                    infos.append(info)
+                conn.send(infos)
+            elif command == 'reset':
+                for i, env in enumerate(envs):
+                    observations[i] = env.reset()
+                conn.send(None)
+            elif command == 'render':
+                conn.send([env.render(data) for env in envs])
+            elif command == 'close':
+                for env in envs:
+                    env.close()
+                conn.send(None)
+                break
+    finally:
+        if events is not None:
+            events.close()
+        conn.close()
+
+
+class SharedMemoryVecEnv:
+    """Drop-in replacement for `SerialVecEnv` which splits the envs made by
+    `list_make_env` into `num_workers` contiguous shards, each stepped in its
+    own process.
+
+    As with `BatchedCraftingEnv`, the observations returned by `step_wait` and
+    `reset` are a view of shared memory which is overwritten by the next step
+    or reset. A finished env is reset by its worker; its terminal observation
+    is returned, and the first observation of its next episode is put in
+    `info['init_observation']`.
+
+    While an `event_log.EventLog` is active, worker k logs events next to it,
+    in `<stem>.<k><suffix>`, appending to it if the active log appends.
+    """
+
+    def __init__(self, list_make_env, num_workers=4):
+        self.num_env = len(list_make_env)
+        num_workers = max(1, min(num_workers, self.num_env))
+        # Read the spaces and limits off one env, as `SerialVecEnv` does.
+        env = list_make_env[0]()
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        self.T = env.T
+        self.max_episode_reward = env.max_episode_reward
+        self.reward_range = env.reward_range
+        env.close()
+
+        observation_shape = (self.num_env,) + self.observation_space.shape
+        observation_dtype = self.observation_space.dtype
+        shared = [_shared_array((self.num_env,), np.int64),
+                  _shared_array(observation_shape, observation_dtype),
+                  _shared_array(observation_shape, observation_dtype),
+                  _shared_array((self.num_env,), np.float64),
+                  _shared_array((self.num_env,), bool)]
+        (self._actions, self._observations, self._init_observations,
+         self._rewards, self._dones) = [_as_array(s) for s in shared]
+
+        bounds = np.linspace(0, self.num_env, num_workers + 1).astype(int)
+        self._conns = []
+        self._processes = []
+        for k, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            events_path = None
+            events_append = False
+            if event_log.ACTIVE is not None:
+                path = event_log.ACTIVE.path
+                events_path = path.with_name(f'{path.stem}.{k}{path.suffix}')
+                events_append = event_log.ACTIVE.appending
+            conn, worker_conn = mp.Pipe()
+            process = mp.Process(
+                target=_worker, daemon=True,
+                args=(worker_conn, list_make_env[start:stop], start, shared,
+                      events_path, events_append))
+            process.start()
+            worker_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+        self.closed = False
+
+    def __len__(self):
+        return self.num_env
+
+    @property
+    def num_workers(self):
+        return len(self._processes)
+
+    def _broadcast(self, command, data=None):
+        for conn in self._conns:
+            conn.send((command, data))
+        return [conn.recv() for conn in self._conns]
+
+    def step_async(self, actions):
+        self._actions[:] = np.asarray(actions).reshape(self.num_env)
+        for conn in self._conns:
+            conn.send(('step', None))
+
+    def step_wait(self):
+        infos = [info for conn in self._conns for info in conn.recv()]
+        dones = self._dones.copy()
+        for i in np.nonzero(dones)[0]:
+            infos[i]['init_observation'] = self._init_observations[i].copy()
+        return self._observations, self._rewards.copy(), dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def reset(self):
+        self._broadcast('reset')
+        return self._observations
+
+    def render(self, mode='human'):
+        return [image for images in self._broadcast('render', mode)
+                for image in images]
+
+    def close(self):
+        if self.closed:
+            return
+        self._broadcast('close')
+        for process in self._processes:
+            process.join()
+        self.closed = True
+
+
+def benchmark(num_env=20, steps=500, worker_counts=(1, 2, 4, 8)):
+    # Only the benchmark needs lagom; `SharedMemoryVecEnv` takes any envs.
+    from lagom.envs.vec_env import SerialVecEnv
+    from dial_control_rl.env import CraftingEnv
+
+    list_make_env = [partial(CraftingEnv, seed, env_id=seed)
+                     for seed in range(num_env)]
+    actions = np.random.RandomState(0).randint(
+        0, CraftingEnv().action_space.n, size=(steps, num_env))
+
+    def measure(venv):
+        venv.reset()
+        start = time.perf_counter()
+        for t in range(steps):
+            venv.step(actions[t])
+        rate = steps * num_env / (time.perf_counter() - start)
+        venv.close()
+        return rate
+
+    serial_rate = measure(SerialVecEnv(list_make_env))
+    print(f'SerialVecEnv ({num_env} envs): {serial_rate:.0f} steps/sec')
+    for num_workers in worker_counts:
+        rate = measure(SharedMemoryVecEnv(list_make_env, num_workers))
+        print(f'SharedMemoryVecEnv ({num_workers} workers): '
+              f'{rate:.0f} steps/sec ({rate / serial_rate:.1f}x)')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -7,7 +7,6 @@ import numpy as np
 from lagom.experiment import Configurator
 from lagom.experiment import BaseExperimentWorker
 from lagom.experiment import BaseExperimentMaster
-from lagom.experiment import run_experiment
 from lagom.envs import EnvSpec
 from lagom.envs import make_vec_env
 from lagom.utils import Seeder
@@ -18,9 +17,136 @@ from functools import partial
 from pathlib import Path
 import torch
 
-from dial_control_rl.env import CraftingEnv
+from dial_control_rl import checkpoint, event_log
+from dial_control_rl.env import CraftingEnv, BatchedCraftingEnv
+from dial_control_rl.game import Layout
+from dial_control_rl.shared_vec_env import SharedMemoryVecEnv
 from dial_control_rl.engine import Engine
-from dial_control_rl.agent import Agent
+from dial_control_rl.agent import Agent, PPOAgent
+from dial_control_rl.scheduler import cores_per_job, run_jobs
+
+
+def algorithm(config, seed, device):
+    if config['agent.mode'] not in ('a2c', 'ppo'):
+        raise ValueError(f"Unknown agent.mode {config['agent.mode']!r}; "
+                         "expected 'a2c' or 'ppo'.")
+    if 'job.threads' in config:
+        # This job's share of the cores, as `run_jobs` gives its workers;
+        # `agent.num_threads` chooses among them.
+        torch.set_num_threads(config['job.threads'])
+    logdir = Path(config['log.dir']) / str(config['ID']) / str(seed)
+    logdir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = logdir / checkpoint.FILENAME
+    saved = None
+    if config['train.resume'] and checkpoint_path.exists():
+        saved = checkpoint.load(checkpoint_path, device)
+        # The last iteration is always checkpointed, so finished jobs are
+        # not trained again.
+        if saved['iteration'] + 1 >= config['train.iter']:
+            print(f'Already trained for {config["train.iter"]} iterations.')
+            return {'iterations': 0, 'timesteps': 0}
+    resume = saved is not None
+    if config['log.events']:
+        events = event_log.EventLog(logdir / 'events.bin', append=resume)
+        event_log.activate(events)
+    seeder = Seeder(seed)
+    seeds = seeder(size=config['env.count'])
+    layout = Layout(**config['env.layout'])
+    if config['env.batched']:
+        venv = BatchedCraftingEnv(seeds, layout)
+    else:
+        env_constructors = []
+        for env_id, env_seed in enumerate(seeds):
+            env_constructors.append(partial(CraftingEnv, env_seed,
+                                            layout, env_id))
+        if config['env.workers'] > 0:
+            venv = SharedMemoryVecEnv(env_constructors,
+                                      config['env.workers'])
+        else:
+            venv = SerialVecEnv(env_constructors)
+    env = VecStandardize(venv, clip_reward=100.0)
+    env_spec = EnvSpec(env)
+
+    if config['agent.mode'] == 'ppo':
+        agent = PPOAgent(config, env_spec, device)
+    else:
+        agent = Agent(config, env_spec, device)
+    start_iter = 0
+    if resume:
+        start_iter = checkpoint.restore(saved, agent, env)
+        print(f'Resuming from iteration {start_iter}.')
+    start_T = agent.total_T
+    runner = RollingSegmentRunner(config, agent, env)
+    engine = Engine(agent, runner, env)
+
+    for i in range(start_iter, config['train.iter']):
+        training_result = engine.train(i)
+        print(f'Training iteration {i} complete.')
+        if i % config['log.interval'] == 0:
+            logs = engine.log_train(training_result)
+            pickle_dump(obj=logs, f=logdir / f'iter_{i}_train_logs', ext='.pkl')
+        if (i % config['checkpoint.interval'] == 0 or
+                i == config['train.iter'] - 1):
+            checkpoint.save(checkpoint_path, engine.agent, env, i)
+    if config['log.events']:
+        event_log.activate(None)
+        events.close()
+    # Only this run's work, to match the scheduler's wall time.
+    return {'iterations': max(config['train.iter'] - start_iter, 0),
+            'timesteps': agent.total_T - start_T}
+
+
+def make_configs():
+    configurator = Configurator('grid')
+
+    configurator.fixed('cuda', False)
+
+    configurator.fixed('algo.lr', 7e-4)
+    configurator.fixed('algo.lr_V', 1e-3)
+    configurator.fixed('algo.gamma', 0.99)
+    configurator.fixed('algo.gae_lambda', 0.97)
+    configurator.fixed('env.count', 20)
+    configurator.fixed('env.batched', True)
+    # Worker processes stepping the unbatched envs; 0 steps them serially.
+    configurator.fixed('env.workers', 0)
+    # Keyword arguments of `game.Layout`; empty for the original 6x4 game.
+    configurator.fixed('env.layout', {})
+    configurator.fixed('agent.count', 20)
+
+    configurator.fixed('agent.standardize_Q', False)
+    configurator.fixed('agent.standardize_adv', False)
+    configurator.fixed('agent.max_grad_norm', 0.5)
+    configurator.fixed('agent.entropy_coef', 0.01)
+    configurator.fixed('agent.value_coef', 0.5)
+    configurator.fixed('agent.fit_terminal_value', False)
+    configurator.fixed('agent.terminal_value_coef', 0.1)
+    # TorchScript the returns and advantage scans in `Agent.learn`.
+    configurator.fixed('agent.jit_returns', False)
+    # 'a2c' takes one step per rollout; 'ppo' takes `agent.ppo_epochs`
+    # epochs of `agent.num_minibatches` steps each.
+    configurator.fixed('agent.mode', 'a2c')
+    configurator.fixed('agent.ppo_epochs', 4)
+    configurator.fixed('agent.num_minibatches', 4)
+    configurator.fixed('agent.clip_range', 0.2)
+    # Torch threads per job, or 'auto' to benchmark the policy on up to the
+    # job's cores and use the fastest.
+    configurator.fixed('agent.num_threads', 'auto')
+
+    configurator.fixed('train.iter', 10000)
+    # Continue from the checkpoint in the log dir, if there is one.
+    configurator.fixed('train.resume', True)
+    # Iterations between checkpoints; the last one is always checkpointed.
+    configurator.fixed('checkpoint.interval', 5)
+    configurator.fixed('log.interval', 10)
+    # Write crafting events to events.bin next to the training logs.
+    configurator.fixed('log.events', True)
+    configurator.fixed('log.dir', 'logs-3')
+
+    return configurator.make_configs()
+
+
+def make_seeds():
+    return [1013845395]
 
 
 class ExperimentWorker(BaseExperimentWorker):
@@ -28,69 +154,26 @@ class ExperimentWorker(BaseExperimentWorker):
         pass
 
     def make_algo(self):
-        def algorithm(config, seed, device):
-            logdir = Path(config['log.dir']) / str(config['ID']) / str(seed)
-            seeder = Seeder(seed)
-            seeds = seeder(size=config['env.count'])
-            env_constructors = []
-            for seed in seeds:
-                env_constructors.append(partial(CraftingEnv, seed))
-            env = VecStandardize(SerialVecEnv(env_constructors),
-                                 clip_reward=100.0)
-            env_spec = EnvSpec(env)
-
-            agent = Agent(config, env_spec, device)
-            runner = RollingSegmentRunner(config, agent, env)
-            engine = Engine(agent, runner, env)
-
-            for i in range(config['train.iter']):
-                training_result = engine.train(i)
-                print(f'Training iteration {i} complete.')
-                if i % config['log.interval'] == 0:
-                    logs = engine.log_train(training_result)
-                    pickle_dump(obj=logs, f=logdir / f'iter_{i}_train_logs', ext='.pkl')
-                    torch.save(engine.agent.policy.state_dict(),
-                               logdir / 'trained_params')
-
-
         return algorithm
 
 
 class ExperimentMaster(BaseExperimentMaster):
     def make_configs(self):
-        configurator = Configurator('grid')
-
-        configurator.fixed('cuda', False)
-
-        configurator.fixed('algo.lr', 7e-4)
-        configurator.fixed('algo.lr_V', 1e-3)
-        configurator.fixed('algo.gamma', 0.99)
-        configurator.fixed('algo.gae_lambda', 0.97)
-        configurator.fixed('env.count', 20)
-        configurator.fixed('agent.count', 20)
-
-        configurator.fixed('agent.standardize_Q', False)
-        configurator.fixed('agent.standardize_adv', False)
-        configurator.fixed('agent.max_grad_norm', 0.5)
-        configurator.fixed('agent.entropy_coef', 0.01)
-        configurator.fixed('agent.value_coef', 0.5)
-        configurator.fixed('agent.fit_terminal_value', False)
-        configurator.fixed('agent.terminal_value_coef', 0.1)
-
-        configurator.fixed('train.iter', 10000)
-        configurator.fixed('log.interval', 10)
-        configurator.fixed('log.dir', 'logs-3')
-
-        return configurator.make_configs()
+        configs = make_configs()
+        # Counted once here, rather than in every worker.
+        threads = cores_per_job(len(configs) * len(make_seeds()))
+        for config in configs:
+            config['job.threads'] = threads
+        return configs
 
     def make_seeds(self):
-        return [1013845395]
+        return make_seeds()
 
     def process_results(self, results):
-        assert all([result is None for result in results])
+        assert all([result is not None for result in results])
 
 
 if __name__ == '__main__':
-    run_experiment(worker_class=ExperimentWorker,
-                   master_class=ExperimentMaster,
-                   num_worker=100)
+    jobs = [(config, seed) for config in make_configs()
+            for seed in make_seeds()]
+    run_jobs(algorithm, jobs, jobs[0][0]['log.dir'])
@@ -0,0 +1,51 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from dial_control_rl import scripted_policy
+
+OBS_DIM = 12
+NUM_ACTIONS = 5
+
+
+class Heads(nn.Module):
+    """Stands in for `Policy`: the layers `scripted_policy.export` takes."""
+
+    def __init__(self):
+        super().__init__()
+        self.featurize = nn.Sequential(nn.Linear(OBS_DIM, 16), nn.ReLU())
+        self.action_head = nn.Module()
+        self.action_head.action_head = nn.Linear(16, NUM_ACTIONS)
+        self.V_head = nn.Module()
+        self.V_head.value_head = nn.Linear(16, 1)
+
+
+@pytest.fixture
+def heads():
+    torch.manual_seed(0)
+    return Heads()
+
+
+@pytest.fixture
+def statistics():
+    """Random observation means and standard deviations."""
+    random_state = np.random.RandomState(0)
+    return random_state.rand(OBS_DIM), random_state.rand(OBS_DIM) + 0.5
+
+
+@pytest.fixture
+def standardized(heads, statistics):
+    """A `StandardizedPolicy` of `heads` and `statistics`."""
+    return scripted_policy.standardized(heads, *statistics, clip_obs=3.0)
+
+
+@pytest.fixture
+def observations():
+    """Raw uint8 observations, each of them twice."""
+    random_state = np.random.RandomState(1)
+    observations = random_state.randint(0, 4, (10, OBS_DIM)).astype(np.uint8)
+    return np.concatenate([observations, observations[::-1]])
@@ -0,0 +1,41 @@
+import sys
+sys.path.append('.')
+
+import pytest
+
+from dial_control_rl import batched_game, game
+
+OTHER_LAYOUT = game.Layout(12, 8, num_gems=7, num_metals=3, num_drop_slots=8,
+                           inv_size=4)
+
+
+@pytest.mark.parametrize('action_seed', [0, 1])
+def test_matches_pycolab(action_seed):
+    batched_game.differential_check(list(range(16)), steps=300,
+                                    action_seed=action_seed)
+
+
+def test_matches_pycolab_on_other_layout():
+    batched_game.differential_check(list(range(8)), steps=200,
+                                    layout=OTHER_LAYOUT)
+
+
+@pytest.mark.parametrize('layout', [game.DEFAULT_LAYOUT, OTHER_LAYOUT])
+def test_only_quit_ends_the_game(layout):
+    for player in (1, 2):
+        for action in range(layout.num_actions):
+            code = game.action_for_player(action, player, layout)
+            assert code != layout.quit
+    engine = game.make_game(0, layout)
+    engine.its_showtime()
+    batch = batched_game.BatchedGame([0], layout)
+    for _ in range(10):
+        for player in (1, 2):
+            action = game.action_for_player(game.Action.SKIP, player, layout)
+            engine.play(action)
+            _, game_over = batch.step([action])
+            assert not engine.game_over and not game_over[0]
+    _, reward, _ = engine.play(layout.quit)
+    rewards, game_over = batch.step([layout.quit])
+    assert engine.game_over and game_over[0]
+    assert (reward or 0) == rewards[0] == 0
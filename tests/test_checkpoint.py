@@ -0,0 +1,82 @@
+import sys
+sys.path.append('.')
+
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from dial_control_rl import checkpoint
+
+
+def make_agent_and_env(seed):
+    torch.manual_seed(seed)
+    policy = nn.Linear(4, 3)
+    policy.optimizer = torch.optim.Adam(policy.parameters(), lr=1e-3)
+    agent = SimpleNamespace(policy=policy, total_T=0)
+    random_state = np.random.RandomState(seed)
+    env = SimpleNamespace(
+        obs_runningavg=SimpleNamespace(mu=random_state.rand(4),
+                                       sigma=random_state.rand(4) + 1),
+        reward_runningavg=SimpleNamespace(mu=0.5, sigma=2.0),
+        all_returns=random_state.rand(2),
+        clip_obs=10.0, eps=1e-8)
+    return agent, env
+
+
+def train_step(agent):
+    loss = agent.policy(torch.randn(8, 4)).pow(2).mean()
+    agent.policy.optimizer.zero_grad()
+    loss.backward()
+    agent.policy.optimizer.step()
+    agent.total_T += 8
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / checkpoint.FILENAME
+    agent, env = make_agent_and_env(0)
+    for _ in range(3):
+        train_step(agent)
+    checkpoint.save(path, agent, env, 2)
+    expected = (random.random(), np.random.rand(), torch.rand(1))
+
+    other_agent, other_env = make_agent_and_env(1)
+    saved = checkpoint.load(path)
+    assert checkpoint.restore(saved, other_agent, other_env) == 3
+    assert (random.random(), np.random.rand(), torch.rand(1)) == expected
+    assert other_agent.total_T == agent.total_T
+    for p, q in zip(agent.policy.parameters(),
+                    other_agent.policy.parameters()):
+        assert torch.equal(p, q)
+    assert np.array_equal(other_env.obs_runningavg.mu, env.obs_runningavg.mu)
+    assert np.array_equal(other_env.all_returns, env.all_returns)
+    assert np.allclose(saved['obs_mean'], env.obs_runningavg.mu)
+    assert np.allclose(saved['obs_std'], env.obs_runningavg.sigma)
+
+    # The optimizer's state carries over, so training continues identically.
+    torch.manual_seed(2)
+    train_step(agent)
+    torch.manual_seed(2)
+    train_step(other_agent)
+    for p, q in zip(agent.policy.parameters(),
+                    other_agent.policy.parameters()):
+        assert torch.equal(p, q)
+
+
+def test_failed_save_keeps_previous_checkpoint(tmp_path, monkeypatch):
+    path = tmp_path / checkpoint.FILENAME
+    agent, env = make_agent_and_env(0)
+    checkpoint.save(path, agent, env, 0)
+
+    def failing_save(obj, f):
+        f.write(b'partial')
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(torch, 'save', failing_save)
+    with pytest.raises(OSError):
+        checkpoint.save(path, agent, env, 1)
+    assert checkpoint.load(path)['iteration'] == 0
+    assert [p.name for p in tmp_path.iterdir()] == [checkpoint.FILENAME]
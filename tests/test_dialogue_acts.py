@@ -0,0 +1,72 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+
+from dial_control_rl.batched_goal_inference import (BatchGoalInference,
+                                                    encode_dialogue_acts)
+from dial_control_rl.dialogue_acts import DialogueAct, Intent
+from dial_control_rl.goal_inference import (BackChannelAct, ForwardChannelAct,
+                                            GoalInference, InferenceState,
+                                            forward_channel)
+from dial_control_rl.nlu_nlg import nlu
+
+QUESTION = DialogueAct(Intent.CONFIRM_GOAL, metal='silver', gem='ruby',
+                       shape='crown')
+OFFER = DialogueAct(Intent.OFFER_ITEM, item='jade')
+
+
+@pytest.mark.parametrize('intent', list(Intent))
+def test_parse_round_trip(intent):
+    for act in DialogueAct.all(intent):
+        assert DialogueAct.parse(str(act)) == act
+
+
+@pytest.mark.parametrize('command', ['fly(up)', 'go(up,down)', 'go',
+                                     'give_goal(gold)', 'a(b)(c)'])
+def test_parse_rejects_bad_commands(command):
+    with pytest.raises(ValueError):
+        DialogueAct.parse(command)
+
+
+def test_answers_depend_on_the_question():
+    assert forward_channel(nlu('no')) is None
+    assert forward_channel(nlu('no'), QUESTION) == (
+        ForwardChannelAct.DISCONFIRM, [])
+    assert forward_channel(nlu('sure'), QUESTION) == (
+        ForwardChannelAct.CONFIRM, [])
+    assert forward_channel(nlu('no, thanks'), OFFER) == (
+        ForwardChannelAct.NOT_PART_OF_GOAL, ['J'])
+    assert forward_channel(nlu('sure'), OFFER) == (
+        ForwardChannelAct.PART_OF_GOAL, ['J'])
+
+
+def unconfirmed(inference, goal=3):
+    """Makes `inference` certain of `goal`, as when it has just asked to
+    confirm it."""
+    inference.conf_per_goal = np.eye(len(inference.conf_per_goal))[goal]
+    assert inference.state == (InferenceState.UNCONFIRMED, goal)
+
+
+def test_answers_to_a_confirmation_request():
+    inference = GoalInference()
+    unconfirmed(inference)
+    assert inference.forward_act(nlu('no'), previous=QUESTION) == (
+        BackChannelAct.RESET, None)
+    assert inference.state[0] == InferenceState.UNCERTAIN
+
+    unconfirmed(inference)
+    assert inference.forward_act(nlu('sure'), previous=QUESTION) == (
+        BackChannelAct.DONE, 3)
+    assert inference.state[0] == InferenceState.CONFIRMED
+
+
+def test_batch_answers():
+    batch = BatchGoalInference(3)
+    batch.conf_per_goal[:, 3] = 1.0
+    back_acts, goals = batch.forward_act(*encode_dialogue_acts(
+        [nlu('no'), nlu('sure'), nlu('sure')], [QUESTION, QUESTION, None]))
+    assert list(back_acts) == [BackChannelAct.RESET, BackChannelAct.DONE,
+                               BackChannelAct.NO_PROGRESS]
+    assert goals[1] == 3
@@ -0,0 +1,47 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+
+from dial_control_rl import event_log
+from dial_control_rl.event_log import EVENT_DTYPE, EventLog, EventType
+
+
+@pytest.mark.parametrize('suffix', ['.bin', '.jsonl'])
+def test_round_trip(tmp_path, suffix):
+    path = tmp_path / ('events' + suffix)
+    events = np.zeros(50, dtype=EVENT_DTYPE)
+    events['frame'] = np.arange(50)
+    events['type'] = EventType.CRAFT
+    events['jewelry'] = 3
+    with EventLog(path, capacity=16) as log:
+        for i in range(30):
+            log.append(EventType.PICKUP, 1, ord('R'), 2, (1, 2), frame=i)
+        log.extend(events)
+    written = event_log.read_events(path)
+    assert len(written) == 80
+    assert np.array_equal(written['frame'][:30], np.arange(30))
+    assert written[0]['item'] == ord('R')
+    assert np.array_equal(written[30:], events)
+
+    with EventLog(path, append=True) as log:
+        log.append(EventType.DROP)
+    assert len(event_log.read_events(path)) == 81
+
+
+def test_failed_writer_raises_in_producers(tmp_path):
+    log = EventLog(tmp_path / 'events.bin', capacity=8, flush_interval=0.01)
+
+    def write(events):
+        raise OSError('No space left on device')
+
+    log._write = write
+    with pytest.raises(RuntimeError) as error:
+        for _ in range(100):
+            log.append(EventType.PICKUP)
+    assert isinstance(error.value.__cause__, OSError)
+    with pytest.raises(RuntimeError):
+        log.flush()
+    with pytest.raises(RuntimeError):
+        log.close()
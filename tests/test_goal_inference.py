@@ -0,0 +1,11 @@
+import sys
+sys.path.append('.')
+
+import pytest
+
+from dial_control_rl import batched_goal_inference
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_batch_matches_serial(seed):
+    batched_goal_inference.differential_check(B=16, turns=300, seed=seed)
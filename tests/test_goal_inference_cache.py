@@ -0,0 +1,68 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+
+from dial_control_rl.goal_inference import (DISTS, ForwardChannelAct,
+                                            GoalInference, InferenceState)
+
+
+def recompute(inference):
+    """The net confidence, state, margin and goal order of `inference`,
+    computed from its confidences without the cache."""
+    net_confidence = np.clip(inference.conf_per_goal - inference.conf_not_goal,
+                             0, 1)
+    most_likely_goal = np.argmax(net_confidence)
+    p = np.array(net_confidence)
+    p[most_likely_goal] = 0.0
+    margin = net_confidence[most_likely_goal] - net_confidence[np.argmax(p)]
+    if margin > inference.certainty_threshold:
+        if inference.confirmed:
+            state = InferenceState.CONFIRMED
+        else:
+            state = InferenceState.UNCONFIRMED
+    elif np.min(inference.conf_not_goal) > 1 - inference.certainty_threshold:
+        state = InferenceState.CONFUSED
+    else:
+        state = InferenceState.UNCERTAIN
+    order = np.argsort(-net_confidence, kind='stable')
+    return net_confidence, (state, most_likely_goal), margin, order
+
+
+def check(inference):
+    net_confidence, state, margin, order = recompute(inference)
+    assert np.array_equal(inference.net_confidence, net_confidence)
+    assert inference.state == state
+    assert inference.margin == margin
+    assert np.array_equal(inference.top_goals(3), order[:3])
+    assert np.array_equal(inference.top_goals(len(order)), order)
+
+
+def test_cache_matches_recompute():
+    random_state = np.random.RandomState(0)
+    abbrevs = sorted(DISTS)
+    acts = [ForwardChannelAct.PART_OF_GOAL, ForwardChannelAct.NOT_PART_OF_GOAL,
+            ForwardChannelAct.CONFIRM]
+    inference = GoalInference(certainty_threshold=0.5)
+    for step in range(500):
+        if step % 7 == 0:
+            # Assign the confidences directly, as the batched inference does.
+            inference.conf_per_goal = random_state.rand(
+                len(inference.conf_per_goal))
+            inference.conf_not_goal = 0.5 * random_state.rand(
+                len(inference.conf_not_goal))
+        elif step % 11 == 0:
+            inference.confirmed = not inference.confirmed
+        else:
+            act = acts[random_state.randint(len(acts))]
+            chosen = random_state.choice(abbrevs, random_state.randint(1, 3),
+                                         replace=False)
+            inference.forward_act(act, list(chosen),
+                                  list(random_state.rand(len(chosen)) + 0.1))
+        check(inference)
+
+
+def test_net_confidence_is_read_only():
+    inference = GoalInference()
+    inference.forward_act(ForwardChannelAct.PART_OF_GOAL, ['G'])
+    assert not inference.net_confidence.flags.writeable
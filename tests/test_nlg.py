@@ -0,0 +1,64 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+
+from dial_control_rl.dialogue_acts import DialogueAct, Intent
+from dial_control_rl.nlu_nlg import NLG_TABLE, TEMPLATES, nlg, nlg_batch, nlu
+
+# The utterances the original `nlg` gave these commands.
+NLG_EXPECTED = [
+    ('accept_action()', 'OK.'),
+    ('request_item(gold)', 'Can you bring gold for me?'),
+    ('offer_item(silver)', 'I can bring silver for you.'),
+    ('decline_offer()', 'No thanks.'),
+    ('request_goal()', "Can you tell me what's your goal?"),
+    ('give_goal(silver,ruby,crown)',
+     'I want to make a silver crown with ruby.'),
+    ('confirm_goal(gold,diamond,ring)',
+     'You want to make a gold ring with diamond. Is that correct?'),
+    ('goal_confirmed()', "Yes, that's right."),
+]
+
+NLG_ACTS = [act for intent in TEMPLATES for act in DialogueAct.all(intent)]
+
+
+@pytest.mark.parametrize('command, utterance', NLG_EXPECTED)
+def test_nlg(command, utterance):
+    assert nlg(command) == utterance
+    assert nlg(DialogueAct.parse(command)) == utterance
+
+
+def test_table_matches_templates():
+    assert set(NLG_TABLE) == set(NLG_ACTS)
+    for act, utterances in NLG_TABLE.items():
+        assert utterances[0] == nlg(str(act))
+        assert len(utterances) == len(TEMPLATES[act.intent])
+
+
+def test_slot_values_outside_the_table():
+    act = DialogueAct(Intent.REQUEST_ITEM, item='crown')
+    assert act not in NLG_TABLE
+    assert nlg(act) == 'Can you bring crown for me?'
+
+
+def test_nlg_batch_matches_nlg():
+    assert nlg_batch(NLG_ACTS) == [nlg(act) for act in NLG_ACTS]
+    batch = nlg_batch(NLG_ACTS, np.random.RandomState(0))
+    random_state = np.random.RandomState(0)
+    assert batch == [nlg(act, random_state) for act in NLG_ACTS]
+    assert len(set(batch) - {nlg(act) for act in NLG_ACTS}) > 0
+
+
+def test_nlu_understands_goals():
+    for act in NLG_ACTS:
+        if act.intent in (Intent.GIVE_GOAL, Intent.CONFIRM_GOAL):
+            assert nlu(nlg(act)) == act
+
+
+@pytest.mark.parametrize('act', [DialogueAct(Intent.SKIP), 'go(up)',
+                                 'fly()'])
+def test_no_utterance(act):
+    with pytest.raises(ValueError):
+        nlg(act)
@@ -0,0 +1,52 @@
+import sys
+sys.path.append('.')
+
+import pytest
+
+from dial_control_rl.nlu_nlg import nlu, nlu_batch
+
+# The commands the original, uncompiled `nlu` gave these utterances.
+NLU_EXPECTED = [
+    ("don't move", 'skip()'),
+    ('hold position', 'skip()'),
+    ('go top', 'go(up)'),
+    ('turn right', 'go(right)'),
+    ('Alright', 'goal_confirmed()'),
+    ('Yes, right', 'goal_confirmed()'),
+    ('now use jade', 'use(jade)'),
+    ('use the gold', 'use(gold)'),
+    ('I really need the silver', 'request(silver)'),
+    ('Can you please go get ruby for me?', 'request(ruby)'),
+    ('do you want silver?', 'offer(silver)'),
+    ('I can go get the ruby for you', 'offer(ruby)'),
+    ("it's ok", 'accept_offer()'),
+    ('that is good', 'accept_offer()'),
+    ('sure', 'accept_offer()'),
+    ('yeah, thanks', 'accept_offer()'),
+    ('no problem', 'accept_offer()'),
+    ('no, thanks', 'decline_offer()'),
+    ("I don't need that", 'decline_offer()'),
+    ('Do not do that', 'decline_offer()'),
+    ("what's your goal", 'request_goal()'),
+    ('what are you planning', 'request_goal()'),
+    ('what do you want', 'request_goal()'),
+    ('I want to make silver crown with ruby', 'give_goal(silver,ruby,crown)'),
+    ('my goal is gold diamond ring', 'give_goal(gold,diamond,ring)'),
+    ('So you wanna silver crown with ruby?',
+     'confirm_goal(silver,ruby,crown)'),
+    ('You are trying to make gold diamond ring',
+     'confirm_goal(gold,diamond,ring)'),
+    ("that's correct", 'goal_confirmed()'),
+    ('exactly', 'goal_confirmed()'),
+    ("hey man what's up", 'invalid_input()'),
+]
+
+
+@pytest.mark.parametrize('utterance, command', NLU_EXPECTED)
+def test_nlu(utterance, command):
+    assert str(nlu(utterance)) == command
+
+
+def test_nlu_batch():
+    utterances = [utterance for utterance, _ in NLU_EXPECTED] * 2
+    assert nlu_batch(utterances) == [nlu(u) for u in utterances]
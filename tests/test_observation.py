@@ -0,0 +1,43 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+
+from dial_control_rl import game
+
+
+def layer_observation(engine):
+    """The observation as the original `render_observation` built it, one
+    board layer at a time."""
+    layout = engine.layout
+    layers = engine._board.layers
+    grid = np.zeros((layout.map_height, layout.map_width), dtype=np.uint8)
+    for c in layout.z_order[:-2]:
+        if c in layers:
+            grid[(grid == 0) & layers[c][:-1]] = ord(c)
+    player1_grid = np.array(layers[game.PLAYER_1][:-1], dtype=np.uint8)
+    player2_grid = np.array(layers[game.PLAYER_2][:-1], dtype=np.uint8)
+    inv1, inv2 = [np.array([ord(engine.the_plot.get(('inv', player, i), ' '))
+                            for i in range(layout.inv_size)])
+                  for player in (1, 2)]
+    return (grid, inv1, inv2, player1_grid, player2_grid,
+            engine.render_completed())
+
+
+@pytest.mark.parametrize('layout', [
+    game.DEFAULT_LAYOUT,
+    game.Layout(12, 8, num_gems=7, num_metals=3, num_drop_slots=8,
+                inv_size=4)])
+def test_render_observation_matches_layers(layout):
+    random_state = np.random.RandomState(0)
+    for seed in range(4):
+        engine = game.make_game(seed, layout)
+        engine.its_showtime()
+        for t in range(300):
+            engine.play(int(random_state.randint(2 * layout.p2_off)))
+            observation = engine.render_observation()
+            for part, expected in zip(observation, layer_observation(engine)):
+                assert np.array_equal(part, expected), (seed, t)
+            goals = engine.observation_buffer[-2 * layout.goal_len:]
+            assert np.array_equal(goals, np.concatenate(engine.goals()))
@@ -0,0 +1,61 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import torch
+
+from dial_control_rl.policy_cache import PolicyCache
+from dial_control_rl.scripted_policy import ScriptedPolicy
+
+
+def expected(policy, observations):
+    return policy.evaluate(torch.from_numpy(observations))
+
+
+def test_matches_policy(standardized, observations):
+    policy = ScriptedPolicy(module=standardized)
+    cache = PolicyCache(policy)
+    for _ in range(2):
+        out = cache(observations)
+        for key, value in expected(policy, observations).items():
+            assert torch.allclose(out[key], value)
+    assert cache.misses == 10
+    assert cache.hits == 30
+    assert len(cache) == 10
+    # Keys are the raw observations' bytes.
+    assert {len(key) for key in cache._entries} == {observations.shape[1]}
+
+    single = cache(observations[3])
+    assert torch.allclose(single['probs'], cache(observations)['probs'][3])
+    assert single['V'].shape == (1,)
+
+
+def test_parameter_changes_invalidate(standardized, observations):
+    policy = ScriptedPolicy(module=standardized)
+    cache = PolicyCache(policy)
+    cache(observations)
+
+    with torch.no_grad():
+        standardized.value_layer.bias += 1.0
+    out = cache(observations)
+    assert cache.invalidations == 1
+    assert torch.allclose(out['V'], expected(policy, observations)['V'])
+
+    state = {k: v.clone() for k, v in standardized.state_dict().items()}
+    state['action_layer.weight'].normal_()
+    standardized.load_state_dict(state)
+    out = cache(observations)
+    assert cache.invalidations == 2
+    assert torch.allclose(out['probs'],
+                          expected(policy, observations)['probs'])
+
+
+def test_evicts_least_recently_used(standardized, observations):
+    cache = PolicyCache(ScriptedPolicy(module=standardized), maxsize=4)
+    cache(observations[:6])
+    assert len(cache) == 4
+    assert cache.evictions == 2
+    cache(observations[2:6])
+    assert cache.misses == 6
+    cache(observations[:1])
+    assert cache.misses == 7
@@ -0,0 +1,54 @@
+import sys
+sys.path.append('.')
+
+import threading
+
+import numpy as np
+import pytest
+
+from dial_control_rl.policy_server import PolicyServer
+from dial_control_rl.scripted_policy import ScriptedPolicy
+
+
+def test_answers_match_module(standardized, observations):
+    expected = ScriptedPolicy(module=standardized)
+    with PolicyServer(standardized) as server:
+        for obs in observations[:4]:
+            V, probs = server.query(obs)
+            assert np.isclose(V, expected.V(obs)[0], atol=1e-6)
+            assert np.allclose(probs, expected.Q(obs)[0], atol=1e-6)
+
+
+def test_batches_concurrent_sessions(standardized, observations):
+    expected = ScriptedPolicy(module=standardized)
+    answers = [None] * len(observations)
+    start = threading.Barrier(len(observations))
+
+    def session(i):
+        start.wait()
+        answers[i] = server.query(observations[i])
+
+    # A long window, so that the sessions' queries are answered together.
+    with PolicyServer(standardized, max_batch=len(observations),
+                      max_latency=1.0) as server:
+        threads = [threading.Thread(target=session, args=(i,))
+                   for i in range(len(observations))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert server.num_queries == len(observations)
+    assert server.num_batches < len(observations)
+    Vs = np.array([V for V, _ in answers])
+    probs = np.stack([probs for _, probs in answers])
+    assert np.allclose(Vs, expected.V(observations), atol=1e-6)
+    assert np.allclose(probs, expected.Q(observations), atol=1e-6)
+
+
+def test_answers_pending_queries_on_close(standardized, observations):
+    server = PolicyServer(standardized, max_latency=10.0)
+    futures = [server.submit(obs) for obs in observations[:3]]
+    server.close()
+    assert all(future.done() for future in futures)
+    with pytest.raises(RuntimeError):
+        server.submit(observations[0])
@@ -0,0 +1,75 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from dial_control_rl import scripted_policy
+from dial_control_rl.scripted_policy import ScriptedPolicy
+
+
+def test_export_round_trip(heads, statistics, standardized, observations,
+                           tmp_path):
+    path = tmp_path / 'policy.pt'
+    scripted_policy.export(heads, path, *statistics, clip_obs=3.0)
+    loaded = ScriptedPolicy(path)
+    expected = ScriptedPolicy(module=standardized)
+    assert np.allclose(loaded.V(observations), expected.V(observations),
+                       atol=1e-6)
+    assert np.allclose(loaded.Q(observations), expected.Q(observations),
+                       atol=1e-6)
+
+
+def test_standardizes_and_clips(statistics, standardized, observations):
+    obs_mean, obs_std = statistics
+    obs = (observations - obs_mean) / (obs_std + 1e-8)
+    obs = torch.from_numpy(np.clip(obs, -3.0, 3.0).astype(np.float32))
+    with torch.no_grad():
+        features = standardized.featurize(obs)
+        Vs = standardized.value_layer(features).squeeze(-1)
+        probs = F.softmax(standardized.action_layer(features), dim=-1)
+
+    policy = ScriptedPolicy(module=standardized)
+    assert np.allclose(policy.V(observations), Vs.numpy(), atol=1e-6)
+    assert np.allclose(policy.Q(observations), probs.numpy(), atol=1e-6)
+    out = policy.evaluate(torch.from_numpy(observations))
+    assert out['V'].shape == (len(observations), 1)
+    assert torch.allclose(out['V'].squeeze(-1), Vs, atol=1e-6)
+    assert torch.allclose(out['probs'], probs, atol=1e-6)
+
+
+def test_single_observations(standardized, observations):
+    policy = ScriptedPolicy(module=standardized)
+    assert policy.V(observations[2]).shape == (1,)
+    assert np.allclose(policy.V(observations[2]), policy.V(observations)[2],
+                       atol=1e-6)
+    assert np.allclose(policy.Q(observations[2]), policy.Q(observations)[2:3],
+                       atol=1e-6)
+
+
+def test_matches_policy_evaluate():
+    pytest.importorskip('lagom')
+    from lagom.envs import EnvSpec
+    from dial_control_rl.agent import Policy
+    from dial_control_rl.env import CraftingEnv
+
+    torch.manual_seed(0)
+    env = CraftingEnv(0)
+    policy = Policy({'algo.rl': 0}, EnvSpec(env), torch.device('cpu'))
+    observations = np.stack([env.reset()] +
+                            [env.step(action)[0] for action in range(3)])
+    random_state = np.random.RandomState(0)
+    obs_mean = random_state.rand(observations.shape[1])
+    obs_std = random_state.rand(observations.shape[1]) + 0.5
+
+    obs = (observations - obs_mean) / (obs_std + 1e-8)
+    obs = torch.from_numpy(np.clip(obs, -10.0, 10.0).astype(np.float32))
+    expected = policy.evaluate(obs, out_keys=('V', 'probs'))
+    scripted = ScriptedPolicy(module=scripted_policy.standardized(
+        policy, obs_mean, obs_std))
+    out = scripted.evaluate(torch.from_numpy(observations))
+    for key in ('V', 'probs'):
+        assert torch.allclose(out[key], expected[key], atol=1e-6)
+
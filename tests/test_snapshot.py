@@ -0,0 +1,55 @@
+import sys
+sys.path.append('.')
+
+import numpy as np
+import pytest
+
+from dial_control_rl import game
+
+
+def new_game(seed, layout):
+    engine = game.make_game(seed, layout)
+    engine.its_showtime()
+    engine.render_observation()
+    return engine
+
+
+def play(engine, actions):
+    """The rewards and observations of playing `actions`, alternating the
+    players as `CraftingEnv` does, until the game ends."""
+    trace = []
+    for t, action in enumerate(actions):
+        if engine.game_over:
+            break
+        _, reward, _ = engine.play(
+            game.action_for_player(action, t % 2 + 1, engine.layout))
+        engine.render_observation()
+        trace.append((reward, engine.observation_buffer.copy()))
+    return trace
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_restore_replays_a_fresh_game(seed):
+    layout = game.DEFAULT_LAYOUT
+    engine = new_game(seed, layout)
+    initial = engine.snapshot()
+    initial_observation = engine.observation_buffer.copy()
+
+    random_state = np.random.RandomState(seed)
+    for _ in range(3):
+        actions = random_state.randint(0, layout.num_actions, 300)
+        fresh = new_game(seed, layout)
+        trace = play(engine, actions)
+        expected = play(fresh, actions)
+        assert len(trace) == len(expected)
+        for (reward, obs), (expected_reward, expected_obs) in zip(trace,
+                                                                 expected):
+            assert reward == expected_reward
+            assert np.array_equal(obs, expected_obs)
+
+        engine.restore(initial)
+        engine.render_observation()
+        assert not engine.game_over
+        assert np.array_equal(engine.observation_buffer, initial_observation)
+        for goal, expected_goal in zip(engine.goals(), fresh.goals()):
+            assert np.array_equal(goal, expected_goal)
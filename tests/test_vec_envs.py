@@ -0,0 +1,149 @@
+import sys
+sys.path.append('.')
+
+from functools import partial
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from dial_control_rl.shared_vec_env import SharedMemoryVecEnv
+
+NUM_ENV = 6
+STEPS = 300
+NUM_ACTIONS = 5
+
+
+class CountingEnv:
+    """A deterministic env which needs no lagom: its observation counts the
+    actions taken this episode, which ends after a seed-dependent number of
+    steps."""
+
+    observation_space = SimpleNamespace(shape=(3,), dtype=np.uint8)
+    action_space = SimpleNamespace(n=NUM_ACTIONS)
+    T = 20
+    max_episode_reward = 100
+    reward_range = (-100.0, 100.0)
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.episode = 0
+
+    def reset(self):
+        self.episode += 1
+        self.t = 0
+        self.observation = np.array([self.seed, self.episode, 0],
+                                    dtype=np.uint8)
+        return self.observation.copy()
+
+    def step(self, action):
+        self.t += 1
+        self.observation[2] += action
+        done = self.t == 5 + (self.seed + self.episode) % 7
+        reward = None if action == 0 else float(action - self.seed)
+        return (self.observation.copy(), reward, done,
+                {'player': self.t % 2 + 1})
+
+    def render(self, mode='human'):
+        return self.observation.copy()
+
+    def close(self):
+        pass
+
+
+def serial_rollout(list_make_env, actions):
+    """Steps the envs one at a time, resetting finished ones as the
+    vectorized envs do."""
+    envs = [make_env() for make_env in list_make_env]
+    yield np.stack([env.reset() for env in envs]), None, None, None
+    for step_actions in actions:
+        observations, rewards, dones, infos = [], [], [], []
+        for env, action in zip(envs, step_actions):
+            observation, reward, done, info = env.step(action)
+            if done:
+                info['init_observation'] = env.reset()
+            observations.append(observation.copy())
+            rewards.append(0.0 if reward is None else reward)
+            dones.append(done)
+            infos.append(info)
+        yield np.stack(observations), np.array(rewards), np.array(dones), infos
+
+
+def vec_rollout(venv, actions):
+    yield np.array(venv.reset()), None, None, None
+    for step_actions in actions:
+        observations, rewards, dones, infos = venv.step(step_actions)
+        yield np.array(observations), np.asarray(rewards), dones, infos
+    venv.close()
+
+
+def assert_same_rollouts(expected, actual, resets=True):
+    num_dones = 0
+    for t, (step, other) in enumerate(zip(expected, actual)):
+        observations, rewards, dones, infos = step
+        assert np.array_equal(observations, other[0]), t
+        if rewards is None:
+            continue
+        assert np.array_equal(rewards, other[1]), t
+        assert np.array_equal(dones, other[2]), t
+        for info, other_info in zip(infos, other[3]):
+            assert info['player'] == other_info['player'], t
+            if 'init_observation' in info:
+                assert np.array_equal(info['init_observation'],
+                                      other_info['init_observation']), t
+        num_dones += dones.sum()
+    if resets:
+        # Make sure that resets were compared too.
+        assert num_dones > 0
+
+
+def random_actions(num_actions):
+    return np.random.RandomState(0).randint(0, num_actions,
+                                            size=(STEPS, NUM_ENV))
+
+
+@pytest.mark.parametrize('num_workers', [1, 2, 4])
+def test_shared_memory_matches_serial(num_workers):
+    list_make_env = [partial(CountingEnv, seed) for seed in range(NUM_ENV)]
+    actions = random_actions(NUM_ACTIONS)
+    assert_same_rollouts(
+        serial_rollout(list_make_env, actions),
+        vec_rollout(SharedMemoryVecEnv(list_make_env, num_workers), actions))
+
+
+def test_shared_memory_renders_every_env():
+    list_make_env = [partial(CountingEnv, seed) for seed in range(NUM_ENV)]
+    venv = SharedMemoryVecEnv(list_make_env, 4)
+    observations = np.array(venv.reset())
+    images = venv.render()
+    venv.close()
+    assert np.array_equal(np.stack(images), observations)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2, 4])
+def test_shared_memory_matches_serial_crafting(num_workers):
+    pytest.importorskip('lagom')
+    from dial_control_rl.env import CraftingEnv
+
+    list_make_env = [partial(CraftingEnv, seed, env_id=seed)
+                     for seed in range(NUM_ENV)]
+    actions = random_actions(CraftingEnv().action_space.n)
+    # Random play seldom ends a crafting game, since the players can't quit;
+    # the `CountingEnv` tests compare resets.
+    assert_same_rollouts(
+        serial_rollout(list_make_env, actions),
+        vec_rollout(SharedMemoryVecEnv(list_make_env, num_workers), actions),
+        resets=False)
+
+
+def test_batched_matches_serial_crafting():
+    pytest.importorskip('lagom')
+    from dial_control_rl.env import BatchedCraftingEnv, CraftingEnv
+
+    seeds = list(range(NUM_ENV))
+    list_make_env = [partial(CraftingEnv, seed, env_id=seed)
+                     for seed in seeds]
+    actions = random_actions(CraftingEnv().action_space.n)
+    assert_same_rollouts(serial_rollout(list_make_env, actions),
+                         vec_rollout(BatchedCraftingEnv(seeds), actions),
+                         resets=False)